@@ -1,26 +1,38 @@
 import sys
 sys.path.append('src')
 
+import atexit
 import logging
+import logging.handlers
+import queue
+import time
+from collections import Counter, OrderedDict
 from colorama import Fore, Style, init
 from pathlib import Path
 
-from input_module import InputModule
-from processing_module import ProcessingModule
-from output_module import OutputModule
-from feedback_module import FeedbackModule
-from config import MODEL_FILE, ENCODERS_FILE
+from config import (
+    MODEL_FILE, ENCODERS_FILE, ML_FEATURES, FUZZY_VARIABLES,
+    BATCH_STREAMING_BYTES, BATCH_CHUNKSIZE
+)
 
 init(autoreset=True)
 
+# Los registros se encolan y un hilo de fondo los escribe en archivo y
+# consola, así el procesamiento no espera a la E/S del log
+_cola_log = queue.SimpleQueue()
+_listener_log = logging.handlers.QueueListener(
+    _cola_log,
+    logging.FileHandler('logs/sistema.log'),
+    logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/sistema.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.handlers.QueueHandler(_cola_log)]
 )
+_listener_log.start()
+atexit.register(_listener_log.stop)
+
 logger = logging.getLogger(__name__)
 
 
@@ -32,8 +44,36 @@ class SistemaRiesgoCrediticio:
         self.modulo_salida = None
         self.modulo_feedback = None
         
+        # Caché LRU de evaluaciones individuales con entradas cuantizadas
+        self._pred_cache = OrderedDict()
+        self._cache_cap = 4096
+        
         self._inicializar_modulos()
     
+    @staticmethod
+    def _quant_key(datos: dict) -> tuple:
+        return tuple(
+            (k, round(v, 2) if isinstance(v, (int, float)) else v)
+            for k, v in sorted(datos.items())
+        )
+    
+    def _procesar_con_cache(self, datos: dict) -> dict:
+        key = self._quant_key(datos)
+        
+        resultado = self._pred_cache.get(key)
+        if resultado is not None:
+            self._pred_cache.move_to_end(key)
+            logger.info("Evaluación recuperada de caché")
+            # Se devuelven los datos de entrada actuales, no los cacheados
+            return {**resultado, 'datos_entrada': datos}
+        
+        resultado = self.modulo_procesamiento.procesar(datos)
+        self._pred_cache[key] = resultado
+        if len(self._pred_cache) > self._cache_cap:
+            self._pred_cache.popitem(last=False)
+        
+        return resultado
+    
     def _inicializar_modulos(self):
         print("\n" + "="*70)
         print(Fore.CYAN + Style.BRIGHT + "   SISTEMA HÍBRIDO DIFUSO-NEURONAL DE CLASIFICACIÓN DE RIESGO")
@@ -48,12 +88,20 @@ class SistemaRiesgoCrediticio:
 
             print(Fore.YELLOW + "\n Inicializando módulos del sistema...")
             
+            # Importaciones diferidas: pandas/xgboost/skfuzzy solo se cargan
+            # cuando el modelo existe y el sistema realmente arranca
+            from input_module import InputModule
+            from processing_module import ProcessingModule
+            from output_module import OutputModule
+            from feedback_module import FeedbackModule
+            
             self.modulo_entrada = InputModule()
             logger.info(" Módulo de Entrada inicializado")
             
             self.modulo_procesamiento = ProcessingModule(
                 modelo_path=MODEL_FILE,
-                encoders_path=ENCODERS_FILE
+                encoders_path=ENCODERS_FILE,
+                verbose=True
             )
             logger.info(" Módulo de Procesamiento inicializado")
             
@@ -94,7 +142,7 @@ class SistemaRiesgoCrediticio:
                 print(Fore.YELLOW + "\nOperación cancelada\n")
                 return None
 
-            resultado = self.modulo_procesamiento.procesar(datos)
+            resultado = self._procesar_con_cache(datos)
 
             self.modulo_salida.mostrar_resultado_detallado(resultado)
  
@@ -119,29 +167,28 @@ class SistemaRiesgoCrediticio:
         try:
             ruta = input("Ruta del archivo CSV: ").strip()
             
+            if Path(ruta).is_file() and Path(ruta).stat().st_size > BATCH_STREAMING_BYTES:
+                self._evaluar_batch_streaming(ruta)
+                return
+            
             df = self.modulo_entrada.cargar_desde_csv(ruta)
             
             if df is None:
                 return
             
+            if df.empty:
+                print(Fore.YELLOW + "\n  No hay solicitudes válidas para procesar\n")
+                return
+            
             print(Fore.YELLOW + f"\n🔄 Procesando {len(df)} solicitudes...\n")
             
 
-            df_resultados = self.modulo_procesamiento.procesar_batch(df)
+            df_resultados = self._procesar_batch_unicos(df)
         
             print(Fore.GREEN + "\n Procesamiento completado\n")
             
-            resultados_lista = []
-            for idx, row in df_resultados.iterrows():
-                resultado = {
-                    'clase': row['prediccion'],
-                    'confianza': row['confianza'],
-                    'score_difuso': row['score_difuso']
-                }
-                resultados_lista.append(resultado)
-            
             # Mostrar estadísticas
-            self.modulo_salida.mostrar_estadisticas_batch(resultados_lista)
+            self.modulo_salida.mostrar_estadisticas_batch(df_resultados)
             
             # Ofrecer exportar
             exportar = input("\n¿Desea exportar resultados a CSV? (s/n): ").lower()
@@ -150,12 +197,110 @@ class SistemaRiesgoCrediticio:
                 if not ruta_salida:
                     ruta_salida = "resultados.csv"
                 
+                resultados_lista = (
+                    df_resultados[['prediccion', 'confianza', 'score_difuso']]
+                    .rename(columns={'prediccion': 'clase'})
+                    .to_dict(orient='records')
+                )
                 self.modulo_salida.exportar_csv(resultados_lista, ruta_salida)
             
         except Exception as e:
             logger.error(f"Error en evaluación batch: {e}")
             print(Fore.RED + f"\n❌ Error: {e}\n")
     
+    def _evaluar_batch_streaming(self, ruta: str):
+        
+        # Archivo grande: se procesa por bloques y los resultados se escriben
+        # a disco según se calculan, sin mantener todo el batch en memoria
+        lector = self.modulo_entrada.cargar_desde_csv(ruta, streaming=True, chunksize=BATCH_CHUNKSIZE)
+        if lector is None:
+            return
+        
+        ruta_salida = input("Nombre del archivo de salida (default: resultados.csv): ").strip()
+        if not ruta_salida:
+            ruta_salida = "resultados.csv"
+        
+        print(Fore.YELLOW + f"\n🔄 Procesando en bloques de {BATCH_CHUNKSIZE:,} solicitudes...\n")
+        
+        conteo_clases = Counter()
+        total = 0
+        rechazadas = 0
+        suma_confianza = 0.0
+        suma_score = 0.0
+        confianza_min = float('inf')
+        confianza_max = float('-inf')
+        
+        # Una sola fecha para toda la exportación, como exportar_csv
+        from datetime import datetime
+        from output_module import FORMATO_FECHA
+        fecha = datetime.now().strftime(FORMATO_FECHA)
+        
+        with lector:
+            for num_bloque, chunk in enumerate(lector):
+                # Mismas reglas que en la carga completa, bloque a bloque
+                chunk, chunk_rechazadas = self.modulo_entrada.validar_datos_df(chunk)
+                self.modulo_entrada.reportar_rechazadas(chunk_rechazadas)
+                rechazadas += len(chunk_rechazadas)
+                if chunk.empty:
+                    continue
+                
+                df_resultados = self._procesar_batch_unicos(chunk)
+                self.modulo_salida.anexar_csv(df_resultados, ruta_salida, encabezado=(total == 0), fecha=fecha)
+                
+                conteo_clases.update(df_resultados['prediccion'].value_counts().to_dict())
+                total += len(df_resultados)
+                suma_confianza += df_resultados['confianza'].sum()
+                suma_score += df_resultados['score_difuso'].sum()
+                confianza_min = min(confianza_min, df_resultados['confianza'].min())
+                confianza_max = max(confianza_max, df_resultados['confianza'].max())
+                
+                logger.info(f"Bloque {num_bloque + 1} procesado: {total:,} solicitudes acumuladas")
+        
+        if rechazadas:
+            print(Fore.YELLOW + f"\n  Total descartadas por validación: {rechazadas:,}")
+        
+        if total == 0:
+            print(Fore.YELLOW + "\n  No hay resultados para mostrar\n")
+            return
+        
+        print(Fore.GREEN + "\n Procesamiento completado\n")
+        
+        self.modulo_salida.mostrar_estadisticas_acumuladas(
+            total=total,
+            conteo_clases=conteo_clases,
+            confianza_media=suma_confianza / total,
+            confianza_min=confianza_min,
+            confianza_max=confianza_max,
+            score_medio=suma_score / total
+        )
+        print(Fore.GREEN + f" Resultados exportados a: {ruta_salida}\n")
+    
+    def _procesar_batch_unicos(self, df):
+        import pandas as pd
+        
+        # Solo se evalúan los perfiles distintos; las filas repetidas reciben
+        # la misma predicción al reconstruir el resultado
+        columnas_clave = [c for c in df.columns if c in set(ML_FEATURES) | set(FUZZY_VARIABLES)]
+        if not columnas_clave:
+            return self.modulo_procesamiento.procesar_batch(df)
+        
+        hashes = pd.util.hash_pandas_object(df[columnas_clave], index=False).to_numpy()
+        unicos = ~pd.Series(hashes).duplicated().to_numpy()
+        
+        if unicos.all():
+            return self.modulo_procesamiento.procesar_batch(df)
+        
+        logger.info(f"Batch deduplicado: {int(unicos.sum())} perfiles únicos de {len(df)} filas")
+        
+        df_unicos = self.modulo_procesamiento.procesar_batch(df[unicos].reset_index(drop=True))
+        df_unicos['_h'] = hashes[unicos]
+        
+        return (
+            df.assign(_h=hashes)
+            .merge(df_unicos[['_h', 'prediccion', 'confianza', 'score_difuso']], on='_h', how='left')
+            .drop(columns='_h')
+        )
+    
     def registrar_feedback_manual(self):
         print("\n" + Fore.CYAN + Style.BRIGHT + "=== REGISTRO DE FEEDBACK ===\n")
         
@@ -165,8 +310,7 @@ class SistemaRiesgoCrediticio:
         try:
             id_eval = input("ID de evaluación (dejar vacío para generar automático): ").strip()
             if not id_eval:
-                from datetime import datetime
-                id_eval = f"MANUAL_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                id_eval = f"MANUAL_{time.strftime('%Y%m%d%H%M%S')}"
             
             print("\nPredicción del sistema:")
             print("  [1] BAJO_RIESGO")
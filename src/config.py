@@ -12,15 +12,15 @@ PROCESSED_DATA_DIR = DATA_DIR / "processed"
 MODELS_DIR = BASE_DIR / "models"
 LOGS_DIR = BASE_DIR / "logs"
 
-# Crear directorios si no existen
-for directory in [DATA_DIR, RAW_DATA_DIR, PROCESSED_DATA_DIR, MODELS_DIR, LOGS_DIR]:
-    directory.mkdir(parents=True, exist_ok=True)
+# Crear directorios si no existen (stat barato antes de intentar mkdir)
+for directory in (DATA_DIR, RAW_DATA_DIR, PROCESSED_DATA_DIR, MODELS_DIR, LOGS_DIR):
+    directory.exists() or directory.mkdir(parents=True, exist_ok=True)
 
 # ==================== ARCHIVOS DE DATOS ====================
 CREDITO_FILE = RAW_DATA_DIR / "dataset_credito1.csv"
 COVID_FILE = RAW_DATA_DIR / "dataset_covid.csv"
 TEMPERATURA_FILE = RAW_DATA_DIR / "dataset_temperatura.csv"
-INTEGRATED_FILE = PROCESSED_DATA_DIR / "dataset_integrado.csv"
+INTEGRATED_FILE = PROCESSED_DATA_DIR / "dataset_integrado.parquet"
 
 # ==================== ARCHIVOS DE MODELOS ====================
 MODEL_FILE = MODELS_DIR / "modelo_xgboost.pkl"
@@ -74,6 +74,41 @@ COLUMNAS_CREDITO = [
   
 ]
 
+# Tipos explícitos para la lectura del CSV de créditos: evita la inferencia
+# de tipos (float64/object por defecto) y reduce la memoria del DataFrame.
+# Los enteros usan tipos nullable (Int*) porque el CSV puede traer vacíos.
+# Sexo, NivelInstruccion, Ocupacion, SegmentoCartera e IdDestinoCredito vienen
+# codificados como números y el modelo los usa como numéricos.
+CREDITO_DTYPES = {
+    'PlazoReal': 'Int16',
+    'monto': 'float32',
+    'Saldo': 'float32',
+    'TasaEfectiva': 'float32',
+    'SalarioNormalizado': 'float32',
+    'EdadDesembolsoNormalizada': 'float32',
+    'EstadoCivil': 'category',
+    'Sexo': 'Int8',
+    'Dependientes': 'Int8',
+    'NivelInstruccion': 'Int8',
+    'Ocupacion': 'Int32',
+    'MaxMontoInterno': 'float32',
+    'iAntiguedadBancarizado': 'float32',
+    'ScoreOriginacionMicro': 'float32',
+    'Score_Sobreendeudamiento': 'float32',
+    'Bal_TotalActivosNormalizado': 'float32',
+    'NetoIngresosNegocioNormalizado': 'float32',
+    'LiquidezDisponibleNormalizado': 'float32',
+    'SegmentoCartera': 'Int8',
+    'IdDestinoCredito': 'Int32',
+    'apoyogobierno': 'Int8',
+    'IdOficinaDesembolso': 'Int32',
+    'Class_202309FM': 'Int8'
+}
+
+# Formato fijo de fechaotorgamiento (ISO): evita que pandas infiera el
+# formato y caiga al parser elemento a elemento
+FECHA_OTORGAMIENTO_FORMATO = '%Y-%m-%d'
+
 # ==================== VARIABLES PARA SISTEMA DIFUSO ====================
 FUZZY_VARIABLES = [
     'ratio_deuda_ingreso',
@@ -171,6 +206,12 @@ FUZZY_PARAMS = {
     }
 }
 
+# Hilos para el kernel Numba del sistema difuso (None = todos los núcleos)
+NUMBA_NUM_THREADS = int(os.environ['NUMBA_NUM_THREADS']) if os.environ.get('NUMBA_NUM_THREADS') else None
+
+# Dispositivo de XGBoost: 'cpu' o 'cuda' si hay GPU (histograma en la GPU)
+XGBOOST_DEVICE = os.environ.get('XGBOOST_DEVICE', 'cpu')
+
 # ==================== PARÁMETROS DEL MODELO ML ====================
 ML_PARAMS = {
     'test_size': 0.2,
@@ -186,10 +227,17 @@ ML_PARAMS = {
         'reg_alpha': 0.1,
         'reg_lambda': 1.0,
         'random_state': 42,
+        'tree_method': 'hist',
+        'device': XGBOOST_DEVICE,
         'n_jobs': -1
     }
 }
 
+# ==================== EVALUACIÓN BATCH ====================
+# Archivos más grandes que este umbral se procesan por bloques
+BATCH_STREAMING_BYTES = 100 * 1024**2
+BATCH_CHUNKSIZE = 50_000
+
 # ==================== CONFIGURACIÓN DE VISUALIZACIÓN ====================
 COLORS = {
     'BAJO_RIESGO': '#28a745',     # Verde
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -5,19 +7,48 @@ from typing import Tuple, Optional
 import logging
 from config import (
     CREDITO_FILE, COVID_FILE, TEMPERATURA_FILE,
-    COLUMNAS_CREDITO, RAW_DATA_DIR
+    COLUMNAS_CREDITO, CREDITO_DTYPES, FECHA_OTORGAMIENTO_FORMATO, RAW_DATA_DIR
 )
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+    PYARROW_ENABLED = True
+except ImportError:
+    PYARROW_ENABLED = False
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Huella del esquema de créditos (columnas y tipos) guardada en los metadatos
+# de la caché Parquet: si config cambia, la caché deja de ser válida
+CLAVE_HUELLA_PARQUET = b'huella_esquema_credito'
+HUELLA_ESQUEMA_CREDITO = hashlib.md5(
+    json.dumps([COLUMNAS_CREDITO, CREDITO_DTYPES], sort_keys=True).encode()
+).hexdigest().encode()
+
+
+def _read_csv_mapeado(ruta: Path, **kwargs) -> pd.DataFrame:
+
+    # El parser C lee directamente del mapeo en memoria del archivo; si el
+    # sistema de archivos no admite mmap (p. ej. unidades remotas) se vuelve
+    # a la lectura en un único búfer
+    try:
+        return pd.read_csv(ruta, memory_map=True, **kwargs)
+    except OSError as e:
+        logger.warning(f"No se pudo mapear {ruta.name} en memoria ({e}). Lectura normal.")
+        return pd.read_csv(ruta, low_memory=False, **kwargs)
+
 
 class DataLoader:
     
     def __init__(self, sample_size: Optional[int] = None):
     
         self.sample_size = sample_size
+        # Copia columnar del CSV de créditos para cargas posteriores
+        self._parquet = CREDITO_FILE.with_suffix('.parquet')
         
     def load_credito_data(self) -> pd.DataFrame:
 
@@ -30,18 +61,27 @@ class DataLoader:
             )
         
         try:
-            # Cargar solo las columnas necesarias
-            df = pd.read_csv(
-                CREDITO_FILE,
-                usecols=COLUMNAS_CREDITO,
-                nrows=self.sample_size,
-                sep=';',              
-                encoding='utf-8-sig', 
-                low_memory=False
-            )
+            df = self._leer_parquet() if self._parquet_vigente() else None
+            desde_cache = df is not None
+            if not desde_cache:
+                # Cargar solo las columnas necesarias, con tipos explícitos
+                try:
+                    df = self._read_credito_csv(dtype=CREDITO_DTYPES)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"El mapa de tipos no coincide con el archivo ({e}). Se infieren los tipos.")
+                    df = self._read_credito_csv()
+            
+            df = self._reducir_tipos(df)
+            
+            # Solo una lectura completa del CSV sirve como caché
+            if not desde_cache and self.sample_size is None:
+                self._guardar_parquet(df)
             
             logger.info(f"Dataset de créditos cargado: {df.shape[0]:,} filas, {df.shape[1]} columnas")
-            logger.info(f"Memoria utilizada: {df.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
+            logger.info(f"Memoria utilizada: {df.memory_usage(deep=False).sum() / 1024**2:.2f} MB")
+            if logger.isEnabledFor(logging.DEBUG):
+                # Recorre cada objeto de las columnas de texto: solo para diagnóstico
+                logger.debug(f"Memoria (deep): {df.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
             
             return df
             
@@ -49,6 +89,118 @@ class DataLoader:
             logger.error(f"Error al cargar dataset de créditos: {e}")
             raise
     
+    @staticmethod
+    def _reducir_tipos(df: pd.DataFrame) -> pd.DataFrame:
+
+        # Complemento del mapa de tipos: ajusta cada columna numérica al
+        # tipo más pequeño que admite su rango observado
+        for col in df.select_dtypes('integer').columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        for col in df.select_dtypes('float').columns:
+            df[col] = pd.to_numeric(df[col], downcast='float')
+        return df
+    
+    def _parquet_vigente(self) -> bool:
+
+        return (
+            PYARROW_ENABLED
+            and self._parquet.exists()
+            and self._parquet.stat().st_mtime >= CREDITO_FILE.stat().st_mtime
+        )
+    
+    def _leer_parquet(self) -> Optional[pd.DataFrame]:
+
+        # None si la caché es de otro esquema o no se puede leer: el llamador
+        # vuelve al CSV y, con una carga completa, reconstruye la caché
+        try:
+            metadatos = pq.read_schema(self._parquet).metadata or {}
+            if metadatos.get(CLAVE_HUELLA_PARQUET) != HUELLA_ESQUEMA_CREDITO:
+                logger.info("La caché Parquet es de otro esquema de columnas. Se lee el CSV.")
+                return None
+            df = pd.read_parquet(self._parquet, columns=COLUMNAS_CREDITO, engine='pyarrow')
+        except (OSError, ValueError, pa.ArrowException) as e:
+            logger.warning(f"No se pudo leer la caché Parquet ({e}). Se lee el CSV.")
+            return None
+        
+        if self.sample_size is not None:
+            df = df.head(self.sample_size)
+        logger.info(f"Dataset de créditos leído desde caché Parquet: {self._parquet.name}")
+        return df
+    
+    def _guardar_parquet(self, df: pd.DataFrame):
+
+        if not PYARROW_ENABLED:
+            return
+        try:
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            tabla = tabla.replace_schema_metadata({
+                **(tabla.schema.metadata or {}),
+                CLAVE_HUELLA_PARQUET: HUELLA_ESQUEMA_CREDITO
+            })
+            pq.write_table(tabla, self._parquet, compression='snappy')
+            logger.info(f"Caché Parquet guardada en: {self._parquet}")
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"No se pudo guardar la caché Parquet: {e}")
+    
+    def _read_credito_csv(self, dtype: Optional[dict] = None) -> pd.DataFrame:
+
+        # PyArrow parsea el CSV en paralelo con varios hilos
+        if PYARROW_ENABLED:
+            try:
+                if self.sample_size is None:
+                    return pd.read_csv(
+                        CREDITO_FILE,
+                        usecols=COLUMNAS_CREDITO,
+                        sep=';',
+                        encoding='utf-8-sig',
+                        dtype=dtype,
+                        parse_dates=['fechaotorgamiento'],
+                        engine='pyarrow'
+                    )
+                return self._read_credito_muestra_pyarrow(dtype)
+            except pa.ArrowInvalid as e:
+                logger.warning(f"Lectura con PyArrow falló ({e}). Se usa el motor C de pandas.")
+
+        return _read_csv_mapeado(
+            CREDITO_FILE,
+            usecols=COLUMNAS_CREDITO,
+            nrows=self.sample_size,
+            sep=';',              
+            encoding='utf-8-sig', 
+            dtype=dtype,
+            parse_dates=['fechaotorgamiento'],
+            date_format=FECHA_OTORGAMIENTO_FORMATO
+        )
+    
+    def _read_credito_muestra_pyarrow(self, dtype: Optional[dict] = None) -> pd.DataFrame:
+
+        # El motor pyarrow de pandas no admite nrows: se leen lotes en streaming
+        # hasta juntar sample_size filas
+        reader = pacsv.open_csv(
+            CREDITO_FILE,
+            parse_options=pacsv.ParseOptions(delimiter=';'),
+            convert_options=pacsv.ConvertOptions(include_columns=COLUMNAS_CREDITO)
+        )
+        
+        lotes = []
+        filas = 0
+        for lote in reader:
+            lotes.append(lote)
+            filas += lote.num_rows
+            if filas >= self.sample_size:
+                break
+        
+        tabla = pa.Table.from_batches(lotes, schema=reader.schema).slice(0, self.sample_size)
+        df = tabla.to_pandas()
+        
+        if dtype:
+            df = df.astype(dtype)
+        df['fechaotorgamiento'] = pd.to_datetime(
+            df['fechaotorgamiento'], format=FECHA_OTORGAMIENTO_FORMATO, errors='coerce'
+        )
+        
+        return df
+    
     def load_covid_data(self) -> pd.DataFrame:
 
         logger.info("Cargando dataset de COVID-19...")
@@ -59,7 +211,7 @@ class DataLoader:
             return pd.DataFrame()
         
         try:
-            df = pd.read_csv(COVID_FILE, low_memory=False)
+            df = _read_csv_mapeado(COVID_FILE)
             
             # columnas 
             columnas_necesarias = ['DEPARTAMENTO', 'FECHA_RESULTADO', 'EDAD', 'SEXO']
@@ -83,7 +235,7 @@ class DataLoader:
             return pd.DataFrame()
         
         try:
-            df = pd.read_csv(TEMPERATURA_FILE)
+            df = _read_csv_mapeado(TEMPERATURA_FILE)
             
             logger.info(f"Dataset de temperatura cargado: {df.shape[0]:,} filas")
             
@@ -118,10 +270,12 @@ class DataLoader:
             return False
         
         # Verificar valores faltantes
-        null_counts = df.isnull().sum()
-        if null_counts.any():
+        # Conteo detallado solo para las columnas que tienen nulos
+        na_mask = df.isna().any()
+        if na_mask.any():
+            null_counts = df.loc[:, na_mask].isna().sum()
             logger.info(f"\nValores faltantes en {dataset_name}:")
-            logger.info(null_counts[null_counts > 0])
+            logger.info(null_counts)
         
         return True
 
@@ -141,15 +295,16 @@ def quick_data_exploration(df: pd.DataFrame, name: str = "Dataset"):
     print(df.dtypes.value_counts())
     
     print(f"\n❓ Valores faltantes:")
-    missing = df.isnull().sum()
-    if missing.any():
+    na_mask = df.isna().any()
+    if na_mask.any():
+        missing = df.loc[:, na_mask].isna().sum()
         missing_pct = (missing / len(df) * 100).round(2)
         missing_df = pd.DataFrame({
             'Columna': missing.index,
             'Faltantes': missing.values,
             'Porcentaje': missing_pct.values
         })
-        print(missing_df[missing_df['Faltantes'] > 0].to_string(index=False))
+        print(missing_df.to_string(index=False))
     else:
         print(" No hay valores faltantes")
     
@@ -1,12 +1,28 @@
 
 import pandas as pd
 import numpy as np
+import polars as pl
 import logging
 from typing import Tuple
 from datetime import datetime
 
+from config import FECHA_OTORGAMIENTO_FORMATO
+
+# Copy-on-Write: las columnas solo se copian cuando se modifican
+# (en pandas >= 3.0 ya está siempre activo y la opción está obsoleta)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 logger = logging.getLogger(__name__)
 
+ESTADO_CIVIL_MAP = {
+    'MARRIED': 'CASADO',
+    'SINGLE': 'SOLTERO',
+    'DIVORCED': 'DIVORCIADO',
+    'COHABITING': 'CONVIVIENTE',
+    'WIDOWED': 'VIUDO'
+}
+
 
 class DataPreprocessor:
     
@@ -17,72 +33,80 @@ class DataPreprocessor:
     def preprocess_credito(self, df: pd.DataFrame) -> pd.DataFrame:
        
         logger.info("Preprocesando dataset de créditos...")
-        df = df.copy()
-        
-        # 1. Eliminar duplicados
-        initial_rows = len(df)
-        df = df.drop_duplicates()
-        logger.info(f"Duplicados eliminados: {initial_rows - len(df)}")
-        
-        # 2. Crear ratio deuda-ingreso
-        df['ratio_deuda_ingreso'] = df['monto'] / (df['SalarioNormalizado'] + 1e-5)
-        df['ratio_deuda_ingreso'] = df['ratio_deuda_ingreso'].clip(0, 10)  # Limitar valores extremos
-        
-        # 3. Normalizar MaxMontoInterno
-        df['MaxMontoInterno_normalizado'] = (
-            (df['MaxMontoInterno'] - df['MaxMontoInterno'].min()) / 
-            (df['MaxMontoInterno'].max() - df['MaxMontoInterno'].min() + 1e-5)
-        )
         
-        # 4. Procesar fechas
-        if 'fechaotorgamiento' in df.columns:
-            df['fechaotorgamiento'] = pd.to_datetime(df['fechaotorgamiento'], errors='coerce')
-            df['año_otorgamiento'] = df['fechaotorgamiento'].dt.year
-            df['mes_otorgamiento'] = df['fechaotorgamiento'].dt.month
+        # Un único plan perezoso que Polars ejecuta por columnas y en
+        # paralelo, sin copias intermedias
+        # 1. Duplicados (antes del plan: las medianas se calculan sin ellos)
+        df_pl = pl.from_pandas(df).unique(maintain_order=True, keep='first')
+        logger.info(f"Duplicados eliminados: {len(df) - df_pl.height}")
+        
+        lf = df_pl.lazy()
+        columnas = set(df.columns)
+        
+        monto_max = pl.col('MaxMontoInterno')
+        pasos = [
+            # 2. Ratio deuda-ingreso
+            (pl.col('monto') / (pl.col('SalarioNormalizado') + 1e-5))
+            .clip(0, 10).alias('ratio_deuda_ingreso'),
+            # 3. MaxMontoInterno normalizado
+            ((monto_max - monto_max.min()) / (monto_max.max() - monto_max.min() + 1e-5))
+            .alias('MaxMontoInterno_normalizado'),
+        ]
         
-        # 5. Manejar valores faltantes en variables clave
-        # Scores: rellenar con mediana
+        # 4. Fechas
+        if 'fechaotorgamiento' in columnas:
+            fecha = pl.col('fechaotorgamiento')
+            if not pd.api.types.is_datetime64_any_dtype(df['fechaotorgamiento']):
+                fecha = fecha.cast(pl.String).str.to_datetime(FECHA_OTORGAMIENTO_FORMATO, strict=False)
+            pasos += [
+                fecha.alias('fechaotorgamiento'),
+                fecha.dt.year().alias('año_otorgamiento'),
+                fecha.dt.month().cast(pl.Int32).alias('mes_otorgamiento'),
+            ]
+        
+        # 5. Valores faltantes
         for col in ['ScoreOriginacionMicro', 'Score_Sobreendeudamiento']:
-            if col in df.columns:
-                df[col].fillna(df[col].median(), inplace=True)
-        
-        # Antigüedad: rellenar con 0 (nuevos clientes)
-        if 'iAntiguedadBancarizado' in df.columns:
-            df['iAntiguedadBancarizado'].fillna(0, inplace=True)
-        
-        # Variables financieras: rellenar con 0
-        financial_cols = [
+            if col in columnas:
+                pasos.append(pl.col(col).fill_null(pl.col(col).median()))
+        rellenar_cero = [
+            'iAntiguedadBancarizado',
             'Bal_TotalActivosNormalizado',
             'NetoIngresosNegocioNormalizado',
             'LiquidezDisponibleNormalizado'
         ]
-        for col in financial_cols:
-            if col in df.columns:
-                df[col].fillna(0, inplace=True)
-        
-        # 6. Convertir EstadoCivil a categorías estándar
-        if 'EstadoCivil' in df.columns:
-            estado_civil_map = {
-                'MARRIED': 'CASADO',
-                'SINGLE': 'SOLTERO',
-                'DIVORCED': 'DIVORCIADO',
-                'COHABITING': 'CONVIVIENTE',
-                'WIDOWED': 'VIUDO'
-            }
-            df['EstadoCivil'] = df['EstadoCivil'].map(estado_civil_map).fillna('OTRO')
-        
-        # 7. Limpiar variable objetivo
-        if 'Class_202309FM' in df.columns:
-            # Eliminar valores faltantes
-            df = df.dropna(subset=['Class_202309FM'])
-            # Eliminar valores anómalos (solo permitir 0 y 1)
-            df = df[df['Class_202309FM'].isin([0, 1])]
-            logger.info(f"Target limpiado. Registros válidos: {len(df):,}")
-            logger.info(f"Distribución: {df['Class_202309FM'].value_counts().to_dict()}")
-        
-        logger.info(f"Dataset de créditos preprocesado: {len(df):,} filas")
+        pasos += [pl.col(col).fill_null(0) for col in rellenar_cero if col in columnas]
         
-        return df
+        # 6. EstadoCivil
+        if 'EstadoCivil' in columnas:
+            pasos.append(
+                pl.col('EstadoCivil').cast(pl.String)
+                .replace_strict(ESTADO_CIVIL_MAP, default='OTRO', return_dtype=pl.String)
+                .cast(pl.Categorical)
+            )
+        
+        lf = lf.with_columns(pasos)
+        
+        # 7. Variable objetivo
+        if 'Class_202309FM' in columnas:
+            lf = lf.filter(pl.col('Class_202309FM').is_in([0, 1]))
+        
+        resultado = lf.collect(engine='streaming').to_pandas()
+        
+        # to_pandas convierte los enteros con nulos a float64: se restauran
+        # los tipos de entrada de las columnas que no cambiaron de contenido
+        tipos = {
+            col: df[col].dtype for col in df.columns
+            if col not in ('EstadoCivil', 'fechaotorgamiento')
+        }
+        resultado = resultado.astype(tipos)
+        
+        if 'Class_202309FM' in columnas:
+            logger.info(f"Target limpiado. Registros válidos: {len(resultado):,}")
+            logger.info(f"Distribución: {resultado['Class_202309FM'].value_counts().to_dict()}")
+        
+        logger.info(f"Dataset de créditos preprocesado: {len(resultado):,} filas")
+        
+        return resultado
     
     def aggregate_covid_data(self, df_covid: pd.DataFrame) -> pd.DataFrame:
        
@@ -92,18 +116,15 @@ class DataPreprocessor:
         
         logger.info("Agregando datos de COVID por departamento...")
         
-        # Convertir fecha
-        df_covid['FECHA_RESULTADO'] = pd.to_datetime(df_covid['FECHA_RESULTADO'], errors='coerce')
-        
-        # Extraer año-mes
-        df_covid['año_mes'] = df_covid['FECHA_RESULTADO'].dt.to_period('M')
-        
-        # Agregar casos por departamento
-        covid_agg = df_covid.groupby('DEPARTAMENTO').agg({
-            'FECHA_RESULTADO': 'count'  # Contar casos totales
-        }).reset_index()
-        
-        covid_agg.columns = ['DEPARTAMENTO', 'casos_covid_total']
+        # Contar casos (fechas válidas) por departamento. La fecha convertida
+        # es una serie aparte: no se modifica el DataFrame del llamador
+        fechas = pd.to_datetime(df_covid['FECHA_RESULTADO'], errors='coerce')
+        covid_agg = (
+            fechas.groupby(df_covid['DEPARTAMENTO']).count()
+            .rename('casos_covid_total')
+            .rename_axis('DEPARTAMENTO')
+            .reset_index()
+        )
         
         # Normalizar intensidad (0-1)
         max_casos = covid_agg['casos_covid_total'].max()
@@ -152,7 +173,6 @@ class DataPreprocessor:
     ) -> pd.DataFrame:
         
         logger.info("Integrando factores externos...")
-        df = df_credito.copy()
         
         # NOTA: Esta es una integración simplificada
         # En un caso real, necesitarías un mapeo de IdOficinaDesembolso -> Departamento
@@ -160,20 +180,22 @@ class DataPreprocessor:
         # Por ahora, usar valores promedio como placeholder
         if not df_covid_agg.empty:
             covid_mean = df_covid_agg['covid_intensity'].mean()
-            df['covid_intensity'] = covid_mean
             logger.info(f"COVID intensity promedio aplicada: {covid_mean:.4f}")
         else:
-            df['covid_intensity'] = 0.0
+            covid_mean = 0.0
             logger.warning("No hay datos de COVID - usando 0.0")
         
         if not df_temp_agg.empty:
             temp_mean = df_temp_agg['temperatura_anomalia'].mean()
-            df['temperatura_anomalia'] = temp_mean
             logger.info(f"Temperatura anomalía promedio aplicada: {temp_mean:.4f}")
         else:
-            df['temperatura_anomalia'] = 0.0
+            temp_mean = 0.0
             logger.warning("No hay datos de temperatura - usando 0.0")
         
+        # assign devuelve un DataFrame nuevo que comparte las columnas
+        # existentes con df_credito (Copy-on-Write), sin copia completa
+        df = df_credito.assign(covid_intensity=covid_mean, temperatura_anomalia=temp_mean)
+        
         logger.info("Integración de factores externos completada")
         
         return df
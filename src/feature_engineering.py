@@ -1,12 +1,18 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler, LabelEncoder, OneHotEncoder
+from sklearn.preprocessing import StandardScaler, OrdinalEncoder, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 import joblib
 import logging
 from typing import Tuple, Dict
 from config import ML_FEATURES, TARGET_COLUMN
 
+try:
+    import pyarrow  # noqa: F401  (respaldo de las columnas 'string[pyarrow]')
+    PYARROW_ENABLED = True
+except ImportError:
+    PYARROW_ENABLED = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,15 +21,17 @@ class FeatureEngineer:
     
     def __init__(self):
         self.scaler = StandardScaler()
-        self.label_encoders = {}
+        self.ordinal_encoder = None
+        # Clases ordenadas de las columnas de texto que llegan al modelo
+        self.text_encoders = {}
         self.feature_names = None
         self.numeric_features = []
         self.categorical_features = []
         
     def identify_feature_types(self, df: pd.DataFrame):
        
-        self.numeric_features = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-        self.categorical_features = df.select_dtypes(include=['object', 'category']).columns.tolist()
+        self.numeric_features = df.select_dtypes(include='number').columns.tolist()
+        self.categorical_features = df.select_dtypes(include=['object', 'string', 'category']).columns.tolist()
         
         # Remover target si está presente
         if TARGET_COLUMN in self.numeric_features:
@@ -34,30 +42,110 @@ class FeatureEngineer:
         logger.info(f"Features numéricas: {len(self.numeric_features)}")
         logger.info(f"Features categóricas: {len(self.categorical_features)}")
         
+    @staticmethod
+    def _como_texto(serie: pd.Series) -> np.ndarray:
+        # Los nulos se codifican como el texto 'nan' tanto al ajustar como al transformar
+        return serie.astype(str).to_numpy(dtype=object, na_value='nan')
+    
+    @staticmethod
+    def _nuevo_ordinal_encoder(categorias='auto') -> OrdinalEncoder:
+        # Las categorías no vistas se codifican como -1
+        return OrdinalEncoder(
+            categories=categorias,
+            handle_unknown='use_encoded_value',
+            unknown_value=-1,
+            dtype=np.int64
+        )
+    
     def encode_categorical(self, df: pd.DataFrame, fit: bool = True) -> pd.DataFrame:
         
         df = df.copy()
         
-        for col in self.categorical_features:
-            if col not in df.columns:
-                continue
-                
+        columnas = [col for col in self.categorical_features if col in df.columns]
+        if not columnas:
+            return df
+        
+        # Un solo OrdinalEncoder para todas las columnas categóricas
+        if fit:
+            self.ordinal_encoder = self._nuevo_ordinal_encoder()
+            entrada = pd.DataFrame({col: self._como_texto(df[col]) for col in columnas}, index=df.index)
+            codigos = self.ordinal_encoder.fit_transform(entrada)
+            for i, col in enumerate(columnas):
+                df[f'{col}_encoded'] = codigos[:, i]
+            return df
+        
+        ajustadas = list(self.ordinal_encoder.feature_names_in_) if self.ordinal_encoder is not None else []
+        presentes = [col for col in ajustadas if col in df.columns]
+        
+        if presentes:
+            # El encoder espera todas las columnas del ajuste: las ausentes se
+            # rellenan y su código se descarta
+            entrada = pd.DataFrame({
+                col: self._como_texto(df[col]) if col in df.columns else 'nan'
+                for col in ajustadas
+            }, index=df.index)
+            codigos = self.ordinal_encoder.transform(entrada)
+            for i, col in enumerate(ajustadas):
+                if col in df.columns:
+                    df[f'{col}_encoded'] = codigos[:, i]
+        
+        for col in columnas:
+            if col not in presentes:
+                df[f'{col}_encoded'] = 0
+        
+        return df
+    
+    def encode_text(self, df: pd.DataFrame, columnas, fit: bool = True) -> pd.DataFrame:
+        
+        # Columnas de texto que quedan tras prepare_features. Al ajustar se
+        # guardan las clases ordenadas de cada columna (las categorías de un
+        # Categorical, mismos códigos que un LabelEncoder); al transformar se
+        # reutilizan (búsqueda binaria, sin volver a ajustar) y los valores no
+        # vistos toman el código de 'DESCONOCIDO' o -1 si no existía
+        df = df.copy()
+        
+        for col in columnas:
             if fit:
-                le = LabelEncoder()
-                df[f'{col}_encoded'] = le.fit_transform(df[col].astype(str))
-                self.label_encoders[col] = le
-            else:
-                if col in self.label_encoders:
-                    le = self.label_encoders[col]
-                    # Manejar categorías no vistas
-                    df[f'{col}_encoded'] = df[col].astype(str).map(
-                        lambda x: le.transform([x])[0] if x in le.classes_ else -1
-                    )
-                else:
-                    df[f'{col}_encoded'] = 0
+                # Conversión a category en las rutas vectorizadas de pandas
+                # (texto Arrow, sin pasar por un array de objetos Python)
+                categorias = df[col].astype('string').fillna('DESCONOCIDO').astype('category').cat
+                self.text_encoders[col] = categorias.categories.to_numpy(dtype=object)
+                df[col] = categorias.codes.astype(np.int32)
+                continue
+            
+            valores = df[col].fillna('DESCONOCIDO').astype(str).to_numpy(dtype=object)
+            df[col] = self.codificar_texto(col, valores)
         
         return df
     
+    def codificar_texto(self, col: str, valores: np.ndarray) -> np.ndarray:
+        
+        # valores: array de objetos str ya sin nulos ('DESCONOCIDO')
+        clases = self._clases_texto(col)
+        if clases is None or len(clases) == 0:
+            return np.full(len(valores), -1)
+        
+        idx = np.minimum(np.searchsorted(clases, valores), len(clases) - 1)
+        conocido = clases[idx] == valores
+        pos_desconocido = np.searchsorted(clases, 'DESCONOCIDO')
+        if pos_desconocido < len(clases) and clases[pos_desconocido] == 'DESCONOCIDO':
+            codigo_desconocido = pos_desconocido
+        else:
+            codigo_desconocido = -1
+        return np.where(conocido, idx, codigo_desconocido)
+    
+    def _clases_texto(self, col: str):
+        if col in self.text_encoders:
+            # Archivos antiguos guardan un LabelEncoder en lugar de las clases
+            clases = self.text_encoders[col]
+            return getattr(clases, 'classes_', clases)
+        # Archivos sin text_encoders: las categorías del OrdinalEncoder de la
+        # misma columna están igual de ordenadas
+        if self.ordinal_encoder is not None and col in self.ordinal_encoder.feature_names_in_:
+            i = list(self.ordinal_encoder.feature_names_in_).index(col)
+            return self.ordinal_encoder.categories_[i]
+        return None
+    
     def scale_numeric(self, df: pd.DataFrame, fit: bool = True) -> pd.DataFrame:
         
         df = df.copy()
@@ -67,10 +155,18 @@ class FeatureEngineer:
         if not numeric_cols_present:
             return df
         
+        # float32: los datos ya se cargan en 32 bits (CREDITO_DTYPES) y así el
+        # escalador no trabaja sobre una copia float64 del bloque numérico
+        # Orden por columnas (Fortran): media y desviación se calculan por
+        # columna y así cada una se recorre en memoria contigua
+        X = np.asfortranarray(df[numeric_cols_present].to_numpy(dtype=np.float32, na_value=np.nan))
+        
         if fit:
-            df[numeric_cols_present] = self.scaler.fit_transform(df[numeric_cols_present])
+            X = self.scaler.fit_transform(X)
         else:
-            df[numeric_cols_present] = self.scaler.transform(df[numeric_cols_present])
+            X = self.scaler.transform(X)
+        
+        df[numeric_cols_present] = X
         
         return df
     
@@ -81,6 +177,16 @@ class FeatureEngineer:
         if fit:
             self.identify_feature_types(df)
         
+        # Texto en buffers Arrow en lugar de arrays de objetos Python: menos
+        # memoria y unique/astype(str) sin recorrer objetos fila a fila
+        if PYARROW_ENABLED:
+            texto = [
+                col for col in self.categorical_features
+                if col in df.columns and df[col].dtype == object
+            ]
+            if texto:
+                df = df.astype({col: 'string[pyarrow]' for col in texto})
+        
         df = self.encode_categorical(df, fit=fit)
         
         df = self.scale_numeric(df, fit=fit)
@@ -117,7 +223,8 @@ class FeatureEngineer:
         
         transformers = {
             'scaler': self.scaler,
-            'label_encoders': self.label_encoders,
+            'ordinal_encoder': self.ordinal_encoder,
+            'text_encoders': self.text_encoders,
             'feature_names': self.feature_names,
             'numeric_features': self.numeric_features,
             'categorical_features': self.categorical_features
@@ -128,11 +235,25 @@ class FeatureEngineer:
     def load_transformers(self, path: str):
         transformers = joblib.load(path)
         self.scaler = transformers['scaler']
-        self.label_encoders = transformers['label_encoders']
+        if 'ordinal_encoder' in transformers:
+            self.ordinal_encoder = transformers['ordinal_encoder']
+        else:
+            self.ordinal_encoder = self._ordinal_desde_label_encoders(transformers.get('label_encoders', {}))
+        self.text_encoders = transformers.get('text_encoders', {})
         self.feature_names = transformers['feature_names']
         self.numeric_features = transformers['numeric_features']
         self.categorical_features = transformers['categorical_features']
         logger.info(f"Transformers cargados desde: {path}")
+    
+    @classmethod
+    def _ordinal_desde_label_encoders(cls, label_encoders: Dict) -> OrdinalEncoder:
+        # Compatibilidad con archivos guardados con un LabelEncoder por columna:
+        # classes_ ya está ordenado, así que los códigos coinciden
+        if not label_encoders:
+            return None
+        columnas = list(label_encoders)
+        encoder = cls._nuevo_ordinal_encoder([label_encoders[col].classes_ for col in columnas])
+        return encoder.fit(pd.DataFrame({col: label_encoders[col].classes_[:1] for col in columnas}))
 
 
 def prepare_train_test_split(
@@ -1,40 +1,130 @@
 #MODULO 4- FEEBACK
 
+import ast
+import atexit
+import csv
+import json
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import logging
 from colorama import Fore, Style
 from pathlib import Path
 from config import FEEDBACK_FILE, MODEL_FILE, ENCODERS_FILE
 
+try:
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
 logger = logging.getLogger(__name__)
 
+COLUMNAS_FEEDBACK = [
+    'id_evaluacion',
+    'fecha_evaluacion',
+    'fecha_feedback',
+    'prediccion_sistema',
+    'resultado_real',
+    'correcto',
+    'monto',
+    'score_difuso',
+    'confianza',
+    'datos_cliente'
+]
+
+COLUMNAS_METRICAS = ['prediccion_sistema', 'resultado_real', 'correcto']
+
+# Registros de feedback acumulados en memoria antes de escribirlos juntos, y
+# segundos máximos que el registro más antiguo puede esperar en el buffer
+TAM_BUFFER_FEEDBACK = 64
+ESPERA_MAX_BUFFER_FEEDBACK = 30.0
+
+
+def _valor_json(valor):
+    # Escalares NumPy a su tipo Python; el resto (fechas, etc.) como texto
+    return valor.item() if isinstance(valor, np.generic) else str(valor)
+
+
+def _serializar_datos(datos: Dict) -> str:
+    # JSON en lugar de str(dict): se puede volver a leer con json.loads
+    if ORJSON_ENABLED:
+        return orjson.dumps(datos, default=_valor_json, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(datos, default=_valor_json, ensure_ascii=False)
+
+
+def _deserializar_datos(texto) -> Dict:
+    # El log tiene filas antiguas con str(dict) y nuevas con JSON: se intenta
+    # JSON y, si no, el literal de Python. Vacío o ilegible -> {}
+    if not isinstance(texto, str) or not texto:
+        return {}
+    try:
+        return orjson.loads(texto) if ORJSON_ENABLED else json.loads(texto)
+    except ValueError:
+        pass
+    try:
+        datos = ast.literal_eval(texto)
+    except (ValueError, SyntaxError):
+        return {}
+    return datos if isinstance(datos, dict) else {}
+
 
 class FeedbackModule:
     
-    def __init__(self, feedback_file: Path = FEEDBACK_FILE):
+    def __init__(
+        self,
+        feedback_file: Path = FEEDBACK_FILE,
+        tam_buffer: int = TAM_BUFFER_FEEDBACK,
+        espera_max: float = ESPERA_MAX_BUFFER_FEEDBACK
+    ):
         self.feedback_file = feedback_file
+        self.tam_buffer = max(1, tam_buffer)
+        self.espera_max = espera_max
+        # Lecturas del log por conjunto de columnas: (firma del archivo, DataFrame)
+        self._cache: Dict[Optional[Tuple[str, ...]], Tuple[Tuple[int, int], pd.DataFrame]] = {}
+        # Registros pendientes de escribir; se vuelcan al llenarse, cuando el
+        # más antiguo supera espera_max segundos, antes de cada lectura y al
+        # terminar el proceso
+        self._buffer: list = []
+        self._inicio_buffer = 0.0
         self._initialize_feedback_log()
+        atexit.register(self._flush)
         
     def _initialize_feedback_log(self):
         if not self.feedback_file.exists():
-            df_inicial = pd.DataFrame(columns=[
-                'id_evaluacion',
-                'fecha_evaluacion',
-                'fecha_feedback',
-                'prediccion_sistema',
-                'resultado_real',
-                'correcto',
-                'monto',
-                'score_difuso',
-                'confianza',
-                'datos_cliente'
-            ])
+            df_inicial = pd.DataFrame(columns=COLUMNAS_FEEDBACK)
             df_inicial.to_csv(self.feedback_file, index=False)
             logger.info(f"Archivo de feedback inicializado: {self.feedback_file}")
     
+    def _flush(self):
+        if not self._buffer:
+            return
+        # Agregar al final del archivo: sin leer ni reescribir el historial
+        with open(self.feedback_file, 'a', newline='', encoding='utf-8') as f:
+            csv.DictWriter(f, fieldnames=COLUMNAS_FEEDBACK).writerows(self._buffer)
+        self._buffer.clear()
+        self._cache.clear()
+    
+    def _cargar_feedback(self, columnas: Optional[list] = None) -> pd.DataFrame:
+        self._flush()
+        
+        # Se reutiliza la lectura anterior mientras el archivo no cambie
+        # (misma fecha de modificación en ns y mismo tamaño)
+        st = self.feedback_file.stat()
+        firma = (st.st_mtime_ns, st.st_size)
+        clave = tuple(columnas) if columnas else None
+        
+        en_cache = self._cache.get(clave)
+        if en_cache is not None and en_cache[0] == firma:
+            return en_cache[1]
+        
+        # Solo las columnas pedidas, leyendo el archivo mapeado en memoria
+        df = pd.read_csv(self.feedback_file, usecols=columnas, memory_map=True)
+        self._cache[clave] = (firma, df)
+        return df
+    
     def registrar_feedback(
         self,
         id_evaluacion: str,
@@ -58,17 +148,15 @@ class FeedbackModule:
                 'monto': datos_evaluacion.get('datos_entrada', {}).get('monto', 0),
                 'score_difuso': datos_evaluacion.get('score_difuso', 0),
                 'confianza': datos_evaluacion.get('confianza', 0),
-                'datos_cliente': str(datos_evaluacion.get('datos_entrada', {}))
+                'datos_cliente': _serializar_datos(datos_evaluacion.get('datos_entrada', {}))
             }
             
-            # Cargar feedback existente
-            df_feedback = pd.read_csv(self.feedback_file)
-            
-            # Agregar nuevo registro
-            df_feedback = pd.concat([df_feedback, pd.DataFrame([nuevo_registro])], ignore_index=True)
-            
-            # Guardar
-            df_feedback.to_csv(self.feedback_file, index=False)
+            ahora = time.monotonic()
+            if not self._buffer:
+                self._inicio_buffer = ahora
+            self._buffer.append(nuevo_registro)
+            if len(self._buffer) >= self.tam_buffer or ahora - self._inicio_buffer >= self.espera_max:
+                self._flush()
             
             logger.info(f"Feedback registrado: ID={id_evaluacion}, Correcto={correcto}")
             
@@ -114,11 +202,12 @@ class FeedbackModule:
             resultado_real = resultado_map.get(opcion)
             
             if resultado_real:
-                # Generar ID único
-                id_evaluacion = f"EVAL_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                # Generar ID único (misma marca de tiempo que la fecha de evaluación)
+                ahora = datetime.now()
+                id_evaluacion = f"EVAL_{ahora.strftime('%Y%m%d%H%M%S')}"
                 
                 # Agregar fecha de evaluación
-                resultado_evaluacion['fecha_evaluacion'] = datetime.now()
+                resultado_evaluacion['fecha_evaluacion'] = ahora
                 
                 # Registrar feedback
                 self.registrar_feedback(
@@ -143,7 +232,7 @@ class FeedbackModule:
     def obtener_metricas_feedback(self) -> Dict:
         
         try:
-            df_feedback = pd.read_csv(self.feedback_file)
+            df_feedback = self._cargar_feedback(COLUMNAS_METRICAS)
             
             if len(df_feedback) == 0:
                 return {'total': 0, 'mensaje': 'No hay feedback registrado'}
@@ -156,10 +245,9 @@ class FeedbackModule:
             distribucion = df_feedback['resultado_real'].value_counts().to_dict()
             
             # Matriz de confusión simplificada
-            confusion = pd.crosstab(
+            confusion = self._matriz_confusion(
                 df_feedback['prediccion_sistema'],
-                df_feedback['resultado_real'],
-                margins=True
+                df_feedback['resultado_real']
             )
             
             metricas = {
@@ -177,6 +265,24 @@ class FeedbackModule:
             logger.error(f"Error al calcular métricas: {e}")
             return {'error': str(e)}
     
+    @staticmethod
+    def _matriz_confusion(prediccion: pd.Series, real: pd.Series) -> pd.DataFrame:
+        # Equivale a pd.crosstab(prediccion, real, margins=True): códigos enteros
+        # por etiqueta y un conteo con np.add.at sobre la matriz pequeña
+        filas, cod_filas = np.unique(prediccion.astype(str).to_numpy(), return_inverse=True)
+        columnas, cod_columnas = np.unique(real.astype(str).to_numpy(), return_inverse=True)
+        
+        conteo = np.zeros((len(filas) + 1, len(columnas) + 1), dtype=np.int64)
+        np.add.at(conteo, (cod_filas, cod_columnas), 1)
+        conteo[-1, :-1] = conteo[:-1, :-1].sum(axis=0)
+        conteo[:, -1] = conteo[:, :-1].sum(axis=1)
+        
+        return pd.DataFrame(
+            conteo,
+            index=pd.Index([*filas, 'All'], name=prediccion.name),
+            columns=pd.Index([*columnas, 'All'], name=real.name)
+        )
+    
     def mostrar_resumen_feedback(self):
         metricas = self.obtener_metricas_feedback()
         
@@ -228,12 +334,18 @@ class FeedbackModule:
     
     def preparar_datos_reentrenamiento(self) -> Optional[pd.DataFrame]:
         try:
-            df_feedback = pd.read_csv(self.feedback_file)
+            df_feedback = self._cargar_feedback()
             
             if len(df_feedback) < 50:
                 logger.warning("Datos insuficientes para reentrenamiento")
                 return None
             
+            # datos_cliente como dict en ambos formatos del log; assign devuelve
+            # una copia y no toca la lectura en caché
+            df_feedback = df_feedback.assign(
+                datos_cliente=df_feedback['datos_cliente'].map(_deserializar_datos)
+            )
+            
             logger.info(f"Datos preparados: {len(df_feedback)} registros")
             return df_feedback
             
@@ -244,7 +356,7 @@ class FeedbackModule:
     def exportar_feedback(self, ruta_salida: str = "feedback_export.csv"):
         
         try:
-            df_feedback = pd.read_csv(self.feedback_file)
+            df_feedback = self._cargar_feedback()
             df_feedback.to_csv(ruta_salida, index=False)
             
             logger.info(f"Feedback exportado: {ruta_salida}")
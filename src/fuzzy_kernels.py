@@ -0,0 +1,384 @@
+"""
+Kernels para la inferencia difusa por lotes
+
+Reproducen la inferencia Mamdani de scikit-fuzzy (AND = fmin, acumulación
+= fmax, implicación por recorte y defuzzificación por centroide sobre el
+universo re-muestreado) sin pasar por ControlSystemSimulation fila a fila.
+Las pertenencias de entrada se calculan con la fórmula triangular (a, b, c)
+de skfuzzy.trimf en lugar de interpolar la función muestreada, como mínimo
+de las dos rectas con los recíprocos de las pendientes precalculados.
+Hay una versión compilada con Numba y otra en NumPy puro por si Numba no
+está instalado.
+
+Diferencia conocida con ControlSystemSimulation: skfuzzy interpola la
+función muestreada en el universo, así que un vértice que no cae en un
+punto de la malla cambia toda la celda que lo contiene. Con las mallas
+actuales es el vértice 0.7 de deuda_max y covid (np.arange(0, 1.01, 0.01)
+da 0.7000000000000001): skfuzzy da a covid['alto'] una pertenencia de
+~1e-16 en toda la celda (0.69, 0.70], donde la fórmula da 0, y lo mismo le
+pasa a deuda_max['media'] junto a 0.7. Si otras reglas disparan, el score
+cambia en ~1e-14; si las únicas activas son las de ese término, skfuzzy
+defuzzifica el recorte minúsculo (centroide del término de salida, p. ej.
+75.0) y el kernel no activa ninguna regla y devuelve valor_defecto (50.0).
+Ejemplo: (ratio_deuda, antiguedad, score_sobreendeud, deuda_max, covid) =
+(6.1667, 0, 659.95, 0.0765, 0.6937). Fuera de esas celdas la diferencia es
+la del float32 de las tablas (< 1e-4). tools/verificar_kernels_difusos.py
+lo comprueba.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from config import NUMBA_NUM_THREADS
+
+try:
+    import numba
+    from numba import njit, prange
+    NUMBA_ENABLED = True
+except ImportError:
+    NUMBA_ENABLED = False
+
+# Kernel de una fila compilado por adelantado (tools/build_fuzzy_aot.py); no
+# necesita Numba en tiempo de ejecución. FIRMA_AOT debe coincidir con los
+# tipos de las tablas de FuzzyCreditRiskSystem._construir_tablas
+MODULO_AOT = 'fuzzy_kernels_aot'
+FIRMA_AOT = 'f8(f4[:], f4[:, :, :], i1[:, :], i1[:], f4[:], f4[:, :], f4[:, :], f4[:, :], f8)'
+
+try:
+    from fuzzy_kernels_aot import score_fila as _score_fila_aot
+    AOT_ENABLED = True
+except ImportError:
+    AOT_ENABLED = False
+
+
+if NUMBA_ENABLED:
+
+    if NUMBA_NUM_THREADS:
+        numba.set_num_threads(min(NUMBA_NUM_THREADS, numba.config.NUMBA_NUM_THREADS))
+
+    @njit(cache=True)
+    def trimf(x, a, c, inv_ba, inv_cb):
+        # min de las dos rectas recortado a [0, 1], sin saltos por tramo. En un
+        # hombro el recíproco es inf: la recta vale -inf fuera y 0 * inf = NaN
+        # justo en el vértice, que _fmin descarta quedándose con la otra recta.
+        # Con x = NaN devuelve NaN, que fmin ignora como en np.interp
+        y = _fmin((x - a) * inv_ba, (c - x) * inv_cb)
+        return y if y != y else min(max(y, 0.0), 1.0)
+    
+    @njit(cache=True)
+    def _fmin(a, b):
+        # Igual que np.fmin: si uno es NaN se devuelve el otro
+        if a != a:
+            return b
+        if b != b:
+            return a
+        return a if a < b else b
+
+    @njit(cache=True)
+    def _fmax(a, b):
+        if a != a:
+            return b
+        if b != b:
+            return a
+        return a if a > b else b
+
+    @njit(cache=True)
+    def _tramo_centroide(x1, y1, x2, y2):
+        # (momento * área, área) de un tramo, con la misma integración por
+        # trapecios que skfuzzy.defuzzify.centroid
+        if (y1 == 0.0 and y2 == 0.0) or x1 == x2:
+            return 0.0, 0.0
+        if y1 == y2:
+            momento = 0.5 * (x1 + x2)
+            area = (x2 - x1) * y1
+        elif y1 == 0.0 and y2 != 0.0:
+            momento = 2.0 / 3.0 * (x2 - x1) + x1
+            area = 0.5 * (x2 - x1) * y2
+        elif y2 == 0.0 and y1 != 0.0:
+            momento = 1.0 / 3.0 * (x2 - x1) + x1
+            area = 0.5 * (x2 - x1) * y1
+        else:
+            momento = (2.0 / 3.0 * (x2 - x1) * (y2 + 0.5 * y1)) / (y1 + y2) + x1
+            area = 0.5 * (x2 - x1) * (y1 + y2)
+        return momento * area, area
+
+    @njit(cache=True)
+    def _min_nan(a, b):
+        # Igual que np.minimum / np.maximum: NaN se propaga
+        if a != a or b != b:
+            return np.nan
+        return a if a < b else b
+
+    @njit(cache=True)
+    def _max_nan(a, b):
+        if a != a or b != b:
+            return np.nan
+        return a if a > b else b
+
+    @njit(cache=True)
+    def _agregado_punto(mf_punto, cortes, activo):
+        agregado = 0.0
+        for c in range(cortes.shape[0]):
+            if activo[c]:
+                agregado = _max_nan(agregado, _min_nan(cortes[c], mf_punto[c]))
+        return agregado
+
+    @njit(cache=True)
+    def _agregado_cruce(mf_celda, pendiente_celda, dx, cortes, activo):
+        # Interpolación lineal dentro de la celda (misma fórmula que np.interp)
+        agregado = 0.0
+        for c in range(cortes.shape[0]):
+            if activo[c]:
+                valor = pendiente_celda[c] * dx + mf_celda[c]
+                agregado = _max_nan(agregado, _min_nan(cortes[c], valor))
+        return agregado
+
+    @njit(cache=True)
+    def _score_fila(x, ant_params, reglas_ant, reglas_cons,
+                    out_universo, out_mfs, out_pendientes, out_inv_pendientes,
+                    valor_defecto):
+        n_var = ant_params.shape[0]
+        n_term = ant_params.shape[1]
+        n_out = out_mfs.shape[0]
+        m = out_universo.shape[0]
+
+        # 1. Fuzzificación con las funciones triangulares
+        mu = np.zeros((n_var, n_term))
+        for v in range(n_var):
+            for t in range(n_term):
+                mu[v, t] = trimf(
+                    x[v], ant_params[v, t, 0], ant_params[v, t, 2],
+                    ant_params[v, t, 3], ant_params[v, t, 4]
+                )
+
+        # 2. Disparo de reglas y acumulación por término de salida
+        cortes = np.zeros(n_out)
+        activo = np.zeros(n_out, dtype=np.bool_)
+        for r in range(reglas_ant.shape[0]):
+            fuerza = np.nan
+            primero = True
+            for v in range(n_var):
+                t = reglas_ant[r, v]
+                if t >= 0:
+                    if primero:
+                        fuerza = mu[v, t]
+                        primero = False
+                    else:
+                        fuerza = _fmin(fuerza, mu[v, t])
+            c = reglas_cons[r]
+            if activo[c]:
+                cortes[c] = _fmax(cortes[c], fuerza)
+            else:
+                cortes[c] = fuerza
+                activo[c] = True
+
+        # 3. Universo re-muestreado (malla + cruces con cada corte) recorrido
+        #    celda a celda, ya ordenado, con la agregación (máximo de los
+        #    términos recortados) y el centroide acumulados en la misma pasada:
+        #    cada punto se integra con el anterior y no se guarda. Las
+        #    pendientes de cada celda vienen precalculadas
+        cruces = np.empty(n_out)
+        suma_momento = 0.0
+        suma_area = 0.0
+        suma_agregado = 0.0
+        x_ant = 0.0
+        y_ant = 0.0
+        for i in range(m):
+            xp = out_universo[i]
+            yp = _agregado_punto(out_mfs[:, i], cortes, activo)
+            if i > 0:
+                momento, area = _tramo_centroide(x_ant, y_ant, xp, yp)
+                suma_momento += momento
+                suma_area += area
+            suma_agregado += yp
+            x_ant = xp
+            y_ant = yp
+            if i == m - 1:
+                break
+
+            # Cruces de cada corte dentro de (u[i], u[i+1]), por inserción
+            n_cruces = 0
+            for c in range(n_out):
+                if not activo[c]:
+                    continue
+                y = cortes[c]
+                if y == 0.0:
+                    a = out_mfs[c, i] > y
+                    b = out_mfs[c, i + 1] > y
+                else:
+                    a = out_mfs[c, i] >= y
+                    b = out_mfs[c, i + 1] >= y
+                if a != b:
+                    xc = out_universo[i] + (y - out_mfs[c, i]) * out_inv_pendientes[c, i]
+                    xc = min(max(xc, out_universo[i]), out_universo[i + 1])
+                    j = n_cruces
+                    while j > 0 and cruces[j - 1] > xc:
+                        cruces[j] = cruces[j - 1]
+                        j -= 1
+                    cruces[j] = xc
+                    n_cruces += 1
+
+            for j in range(n_cruces):
+                xp = cruces[j]
+                yp = _agregado_cruce(
+                    out_mfs[:, i], out_pendientes[:, i], xp - out_universo[i], cortes, activo
+                )
+                momento, area = _tramo_centroide(x_ant, y_ant, xp, yp)
+                suma_momento += momento
+                suma_area += area
+                suma_agregado += yp
+                x_ant = xp
+                y_ant = yp
+
+        # Sin ninguna regla activa el área es nula y skfuzzy no puede
+        # defuzzificar: se usa el mismo valor neutro que evaluate()
+        if suma_agregado == 0.0:
+            return valor_defecto
+
+        return suma_momento / max(suma_area, np.finfo(np.float64).eps)
+
+    @njit(parallel=True, cache=True)
+    def fuzzy_scores(X, ant_params, reglas_ant, reglas_cons,
+                     out_universo, out_mfs, out_pendientes, out_inv_pendientes,
+                     valor_defecto):
+        """Score difuso por fila; las filas son independientes (prange)."""
+        n = X.shape[0]
+        scores = np.empty(n)
+        for i in prange(n):
+            scores[i] = _score_fila(
+                X[i], ant_params, reglas_ant, reglas_cons,
+                out_universo, out_mfs, out_pendientes, out_inv_pendientes,
+                valor_defecto
+            )
+        return scores
+
+
+# ==================== SCORE DE UNA FILA ====================
+
+def fuzzy_score_fila(x, ant_params, reglas_ant, reglas_cons,
+                     out_universo, out_mfs, out_pendientes, out_inv_pendientes,
+                     valor_defecto):
+    """Score de un solo vector de entradas, sin el reparto en paralelo de fuzzy_scores."""
+    tablas = (ant_params, reglas_ant, reglas_cons,
+              out_universo, out_mfs, out_pendientes, out_inv_pendientes)
+    if AOT_ENABLED:
+        return _score_fila_aot(x, *tablas, valor_defecto)
+    if NUMBA_ENABLED:
+        return _score_fila(x, *tablas, valor_defecto)
+    return float(fuzzy_scores_numpy(x[None, :], *tablas, valor_defecto)[0])
+
+
+# ==================== VERSIÓN NUMPY (SIN NUMBA) ====================
+
+# Filas por bloque: acota la memoria de las matrices (filas x puntos)
+TAM_BLOQUE_NUMPY = 4096
+
+
+def trimf_numpy(x, a, b, c, inv_ba, inv_cb):
+    """Versión vectorizada de trimf: solo ufuncs, sin máscaras por tramo."""
+    with np.errstate(invalid='ignore'):
+        y = np.fmin((x - a) * inv_ba, (c - x) * inv_cb)
+    return np.clip(y, 0.0, 1.0, out=y)
+
+
+def fuzzy_scores_numpy(X, ant_params, reglas_ant, reglas_cons,
+                       out_universo, out_mfs, out_pendientes, out_inv_pendientes,
+                       valor_defecto):
+    """Misma inferencia que fuzzy_scores, vectorizada sobre las filas."""
+    scores = np.empty(X.shape[0])
+    for inicio in range(0, X.shape[0], TAM_BLOQUE_NUMPY):
+        fin = inicio + TAM_BLOQUE_NUMPY
+        scores[inicio:fin] = _scores_bloque_numpy(
+            X[inicio:fin], ant_params, reglas_ant, reglas_cons,
+            out_universo, out_mfs, out_inv_pendientes, valor_defecto
+        )
+    return scores
+
+
+def _scores_bloque_numpy(X, ant_params, reglas_ant, reglas_cons,
+                         out_universo, out_mfs, out_inv_pendientes, valor_defecto):
+    n = X.shape[0]
+    n_var, n_term, _ = ant_params.shape
+
+    # 1. Pertenencias (n, n_var, n_term)
+    mu = np.empty((n, n_var, n_term))
+    for v in range(n_var):
+        for t in range(n_term):
+            mu[:, v, t] = trimf_numpy(X[:, v], *ant_params[v, t])
+
+    # 2. Fuerza de cada regla y corte por término de salida, con la función
+    #    generada para este conjunto de reglas
+    terminos_activos = np.unique(reglas_cons)
+    cortes = _funcion_cortes(
+        tuple(map(tuple, reglas_ant.tolist())), tuple(reglas_cons.tolist())
+    )(mu)
+
+    # 3. Universo re-muestreado: malla + cruces de cada término con su corte.
+    #    Los puntos repetidos no aportan área, así que no hace falta deduplicar
+    partes = [np.broadcast_to(out_universo, (n, out_universo.size))]
+    for j, c in enumerate(terminos_activos):
+        mf = out_mfs[c]
+        y = cortes[:, j:j + 1]
+        sobre = np.where(y == 0.0, mf > y, mf >= y)
+        cambia = sobre[:, :-1] != sobre[:, 1:]
+        with np.errstate(invalid='ignore'):
+            cruces = out_universo[:-1] + (y - mf[:-1]) * out_inv_pendientes[c]
+        partes.append(np.where(cambia, cruces, np.nan))
+    puntos = np.sort(np.concatenate(partes, axis=1), axis=1)
+    validos = ~np.isnan(puntos)
+
+    # 4. Agregación (máximo de los términos recortados)
+    agregado = np.zeros_like(puntos)
+    for j, c in enumerate(terminos_activos):
+        recortado = np.minimum(cortes[:, j:j + 1], np.interp(puntos, out_universo, out_mfs[c]))
+        agregado = np.maximum(agregado, recortado)
+    agregado = np.where(validos, agregado, 0.0)
+
+    # 5. Centroide por trapecios, igual que skfuzzy.defuzzify.centroid
+    x1, x2 = puntos[:, :-1], puntos[:, 1:]
+    y1, y2 = agregado[:, :-1], agregado[:, 1:]
+    tramo = validos[:, 1:] & ~((y1 == 0.0) & (y2 == 0.0)) & (x1 != x2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        area = 0.5 * (x2 - x1) * (y1 + y2)
+        momento = (2.0 / 3.0 * (x2 - x1) * (y2 + 0.5 * y1)) / (y1 + y2) + x1
+    suma_area = np.where(tramo, area, 0.0).sum(axis=1)
+    suma_momento = np.where(tramo, momento * area, 0.0).sum(axis=1)
+    scores = suma_momento / np.maximum(suma_area, np.finfo(np.float64).eps)
+
+    # Área nula: skfuzzy no puede defuzzificar y evaluate() usa el valor neutro
+    return np.where(agregado.sum(axis=1) == 0.0, valor_defecto, scores)
+
+
+@lru_cache(maxsize=8)
+def _funcion_cortes(reglas_ant, reglas_cons):
+    """
+    Genera y compila una función mu -> cortes (n, n_terminos_activos) con una
+    expresión fija por regla: mu[:, v, t] combinados con np.fmin (AND) y
+    acumulados con np.fmax por término de salida, sin recorrer la matriz de
+    reglas en cada bloque.
+    """
+    lineas = ['def _cortes(mu):']
+    por_termino = {}
+    for r, (terminos, c) in enumerate(zip(reglas_ant, reglas_cons)):
+        expr = None
+        for v, t in enumerate(terminos):
+            if t < 0:
+                continue
+            ref = f'mu[:, {v}, {t}]'
+            expr = ref if expr is None else f'np.fmin({expr}, {ref})'
+        if expr is None:
+            expr = 'np.full(mu.shape[0], np.nan)'
+        lineas.append(f'    r{r} = {expr}')
+        por_termino.setdefault(c, []).append(f'r{r}')
+
+    columnas = []
+    for c in sorted(por_termino):
+        expr = por_termino[c][0]
+        for nombre in por_termino[c][1:]:
+            expr = f'np.fmax({expr}, {nombre})'
+        columnas.append(expr)
+    lineas.append(f'    return np.stack([{", ".join(columnas)}], axis=1)')
+
+    espacio = {'np': np}
+    exec(compile('\n'.join(lineas), '<reglas difusas>', 'exec'), espacio)
+    return espacio['_cortes']
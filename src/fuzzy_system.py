@@ -1,69 +1,133 @@
 import numpy as np
 import skfuzzy as fuzz
 from skfuzzy import control as ctrl
+from skfuzzy.control.term import Term
+import hashlib
+import inspect
+import joblib
 import logging
+import os
 import pandas as pd
 from typing import Dict, Any
 import warnings
 warnings.filterwarnings('ignore')
 
+from config import FUZZY_RULES_FILE
+from fuzzy_kernels import NUMBA_ENABLED, fuzzy_score_fila, fuzzy_scores_numpy
+if NUMBA_ENABLED:
+    from fuzzy_kernels import fuzzy_scores
+
 logger = logging.getLogger(__name__)
 
 
 class FuzzyCreditRiskSystem:
   
+    # (entrada de evaluate, columna del DataFrame, valor por defecto, mínimo, máximo)
+    _ENTRADAS = (
+        ('ratio_deuda', 'ratio_deuda_ingreso', 0, 0, 10),
+        ('antiguedad', 'iAntiguedadBancarizado', 0, 0, 120),
+        ('score_sobreendeud', 'Score_Sobreendeudamiento', 500, 0, 1000),
+        ('deuda_max', 'MaxMontoInterno_normalizado', 0, 0, 1),
+        ('covid', 'covid_intensity', 0, 0, 1),
+    )
+    # Nombres, columnas y valores por defecto de _ENTRADAS, calculados una
+    # sola vez para no recorrer la tupla en cada evaluación
+    _NOMBRES_ENTRADA = tuple(e[0] for e in _ENTRADAS)
+    _COLUMNAS_ENTRADA = pd.Index([e[1] for e in _ENTRADAS])
+    _DEFECTOS_ENTRADA = np.array([e[2] for e in _ENTRADAS], dtype=np.float32)
+    
+    # Límites de la escala de interpret_score y categoría de cada tramo
+    _LIMITES_RIESGO = np.array([25, 45, 65, 85], dtype=np.float64)
+    _ETIQUETAS_RIESGO = np.array(['MUY_BAJO', 'BAJO', 'MEDIO', 'ALTO', 'MUY_ALTO'])
     
     def __init__(self):
         self.sistema = None
         self.simulacion = None
-        self._build_system()
+        if not self._cargar_cache():
+            self._build_system()
+            self._guardar_cache()
+    
+    def _clave_cache(self) -> str:
+        # Cambia con cualquier edición de la clase (términos, reglas, tablas)
+        # o con otra versión de skfuzzy: la caché vieja se ignora sola
+        clases = [c for c in type(self).__mro__ if c is not object]
+        fuente = ''.join(inspect.getsource(c) for c in clases) + fuzz.__version__
+        return hashlib.md5(fuente.encode()).hexdigest()
+    
+    def _cargar_cache(self) -> bool:
+        # Sistema ya construido (variables, reglas, ControlSystem y tablas del
+        # kernel) de una ejecución anterior: evita reconstruirlo en cada arranque
+        try:
+            cache = joblib.load(FUZZY_RULES_FILE)
+            if cache.get('clave') != self._clave_cache():
+                return False
+            self.__dict__.update(cache['estado'])
+        except Exception:
+            return False
+        
+        logger.info("Sistema difuso cargado desde caché")
+        return True
+    
+    def _guardar_cache(self):
+        try:
+            temporal = FUZZY_RULES_FILE.with_name(f"{FUZZY_RULES_FILE.name}.{os.getpid()}.tmp")
+            joblib.dump({'clave': self._clave_cache(), 'estado': self.__dict__}, temporal)
+            os.replace(temporal, FUZZY_RULES_FILE)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la caché del sistema difuso: {e}")
+    
+    def _trimf(self, variable, etiqueta: str, abc: list):
+        # Define el término en skfuzzy y guarda (a, b, c) para los kernels por lotes
+        variable[etiqueta] = fuzz.trimf(variable.universe, abc)
+        self._params_trimf[(variable.label, etiqueta)] = abc
         
     def _build_system(self):
         logger.info("Construyendo sistema de inferencia difuso...")
+        self._params_trimf = {}
         
         # VARIABLES DE ENTRADA 
         
         # 1. Ratio Deuda-Ingreso
         self.ratio_deuda = ctrl.Antecedent(np.arange(0, 10.1, 0.1), 'ratio_deuda')
-        self.ratio_deuda['bajo'] = fuzz.trimf(self.ratio_deuda.universe, [0, 0, 2])
-        self.ratio_deuda['moderado'] = fuzz.trimf(self.ratio_deuda.universe, [1, 3, 5])
-        self.ratio_deuda['alto'] = fuzz.trimf(self.ratio_deuda.universe, [4, 6, 8])
-        self.ratio_deuda['critico'] = fuzz.trimf(self.ratio_deuda.universe, [7, 10, 10])
+        self._trimf(self.ratio_deuda, 'bajo', [0, 0, 2])
+        self._trimf(self.ratio_deuda, 'moderado', [1, 3, 5])
+        self._trimf(self.ratio_deuda, 'alto', [4, 6, 8])
+        self._trimf(self.ratio_deuda, 'critico', [7, 10, 10])
         
         # 2. Antigüedad Bancarizada (en meses)
         self.antiguedad = ctrl.Antecedent(np.arange(0, 121, 1), 'antiguedad')
-        self.antiguedad['nuevo'] = fuzz.trimf(self.antiguedad.universe, [0, 0, 6])
-        self.antiguedad['regular'] = fuzz.trimf(self.antiguedad.universe, [3, 12, 24])
-        self.antiguedad['estable'] = fuzz.trimf(self.antiguedad.universe, [18, 36, 60])
-        self.antiguedad['veterano'] = fuzz.trimf(self.antiguedad.universe, [48, 120, 120])
+        self._trimf(self.antiguedad, 'nuevo', [0, 0, 6])
+        self._trimf(self.antiguedad, 'regular', [3, 12, 24])
+        self._trimf(self.antiguedad, 'estable', [18, 36, 60])
+        self._trimf(self.antiguedad, 'veterano', [48, 120, 120])
         
         # 3. Score de Sobreendeudamiento
         self.score_sobreendeud = ctrl.Antecedent(np.arange(0, 1001, 1), 'score_sobreendeud')
-        self.score_sobreendeud['critico'] = fuzz.trimf(self.score_sobreendeud.universe, [0, 0, 300])
-        self.score_sobreendeud['riesgoso'] = fuzz.trimf(self.score_sobreendeud.universe, [200, 400, 600])
-        self.score_sobreendeud['aceptable'] = fuzz.trimf(self.score_sobreendeud.universe, [500, 700, 850])
-        self.score_sobreendeud['excelente'] = fuzz.trimf(self.score_sobreendeud.universe, [800, 1000, 1000])
+        self._trimf(self.score_sobreendeud, 'critico', [0, 0, 300])
+        self._trimf(self.score_sobreendeud, 'riesgoso', [200, 400, 600])
+        self._trimf(self.score_sobreendeud, 'aceptable', [500, 700, 850])
+        self._trimf(self.score_sobreendeud, 'excelente', [800, 1000, 1000])
         
         # 4. Deuda Máxima Normalizada
         self.deuda_max = ctrl.Antecedent(np.arange(0, 1.01, 0.01), 'deuda_max')
-        self.deuda_max['baja'] = fuzz.trimf(self.deuda_max.universe, [0, 0, 0.3])
-        self.deuda_max['media'] = fuzz.trimf(self.deuda_max.universe, [0.2, 0.5, 0.7])
-        self.deuda_max['alta'] = fuzz.trimf(self.deuda_max.universe, [0.6, 1.0, 1.0])
+        self._trimf(self.deuda_max, 'baja', [0, 0, 0.3])
+        self._trimf(self.deuda_max, 'media', [0.2, 0.5, 0.7])
+        self._trimf(self.deuda_max, 'alta', [0.6, 1.0, 1.0])
         
         # 5. Intensidad COVID (0-1)
         self.covid = ctrl.Antecedent(np.arange(0, 1.01, 0.01), 'covid')
-        self.covid['sin_impacto'] = fuzz.trimf(self.covid.universe, [0, 0, 0.2])
-        self.covid['bajo'] = fuzz.trimf(self.covid.universe, [0.1, 0.3, 0.5])
-        self.covid['moderado'] = fuzz.trimf(self.covid.universe, [0.4, 0.6, 0.8])
-        self.covid['alto'] = fuzz.trimf(self.covid.universe, [0.7, 1.0, 1.0])
+        self._trimf(self.covid, 'sin_impacto', [0, 0, 0.2])
+        self._trimf(self.covid, 'bajo', [0.1, 0.3, 0.5])
+        self._trimf(self.covid, 'moderado', [0.4, 0.6, 0.8])
+        self._trimf(self.covid, 'alto', [0.7, 1.0, 1.0])
         
         # ============== DEFINIR VARIABLE DE SALIDA ==============
         self.riesgo_difuso = ctrl.Consequent(np.arange(0, 101, 1), 'riesgo_difuso')
-        self.riesgo_difuso['muy_bajo'] = fuzz.trimf(self.riesgo_difuso.universe, [0, 0, 25])
-        self.riesgo_difuso['bajo'] = fuzz.trimf(self.riesgo_difuso.universe, [15, 35, 50])
-        self.riesgo_difuso['medio'] = fuzz.trimf(self.riesgo_difuso.universe, [40, 55, 70])
-        self.riesgo_difuso['alto'] = fuzz.trimf(self.riesgo_difuso.universe, [60, 75, 90])
-        self.riesgo_difuso['muy_alto'] = fuzz.trimf(self.riesgo_difuso.universe, [85, 100, 100])
+        self._trimf(self.riesgo_difuso, 'muy_bajo', [0, 0, 25])
+        self._trimf(self.riesgo_difuso, 'bajo', [15, 35, 50])
+        self._trimf(self.riesgo_difuso, 'medio', [40, 55, 70])
+        self._trimf(self.riesgo_difuso, 'alto', [60, 75, 90])
+        self._trimf(self.riesgo_difuso, 'muy_alto', [85, 100, 100])
         
         # REGLAS DIFUSAS 
         reglas = self._create_rules()
@@ -71,8 +135,79 @@ class FuzzyCreditRiskSystem:
         #  SISTEMA DE CONTROL 
         self.sistema = ctrl.ControlSystem(reglas)
         self.simulacion = ctrl.ControlSystemSimulation(self.sistema)
+        self._antecedentes = [getattr(self, nombre) for nombre, *_ in self._ENTRADAS]
+        self._limites_min = np.array([e[3] for e in self._ENTRADAS], dtype=np.float32)
+        self._limites_max = np.array([e[4] for e in self._ENTRADAS], dtype=np.float32)
+        
+        try:
+            self._construir_tablas(reglas)
+        except ValueError as e:
+            # Reglas con OR/NOT: se mantiene la simulación fila a fila
+            logger.warning(f"Evaluación vectorizada no disponible: {e}")
+            self._tablas = None
         
         logger.info(f"Sistema difuso construido con {len(reglas)} reglas")
+    
+    def _construir_tablas(self, reglas):
+        # Copia en arrays de las funciones de pertenencia y de las reglas
+        # para el kernel por lotes; skfuzzy sigue siendo la definición
+        antecedentes = self._antecedentes
+        n_var = len(antecedentes)
+        n_term = max(len(ant.terms) for ant in antecedentes)
+        
+        # (a, b, c, 1/(b-a), 1/(c-b)) de cada término; los recíprocos son inf
+        # en los hombros (a == b o b == c). Los huecos de variables con menos
+        # términos quedan en NaN y ninguna regla los referencia.
+        # Las tablas y las entradas del kernel van en float32: pertenencias en
+        # [0, 1] y entradas de 2-3 cifras significativas no necesitan más, y
+        # entradas y vértices se redondean igual (x == b sigue valiendo 1)
+        ant_params = np.full((n_var, n_term, 5), np.nan, dtype=np.float32)
+        indices = {}
+        for v, ant in enumerate(antecedentes):
+            for t, etiqueta in enumerate(ant.terms):
+                if (ant.label, etiqueta) not in self._params_trimf:
+                    raise ValueError(f"Término sin parámetros triangulares: {ant.label}[{etiqueta}]")
+                a, b, c = np.array(self._params_trimf[(ant.label, etiqueta)], dtype=np.float32)
+                with np.errstate(divide='ignore'):
+                    ant_params[v, t] = (a, b, c, np.float32(1.0) / (b - a), np.float32(1.0) / (c - b))
+                indices[(ant.label, etiqueta)] = (v, t)
+        
+        etiquetas_salida = list(self.riesgo_difuso.terms)
+        out_universo = self.riesgo_difuso.universe.astype(np.float32)
+        out_mfs = np.stack([t.mf for t in self.riesgo_difuso.terms.values()]).astype(np.float32)
+        
+        # Matriz de reglas (n_reglas, n_var) con el índice del término de
+        # cada variable o -1 si la regla no la usa, y término de salida por
+        # regla. int8 basta (pocos términos): la tabla ocupa un par de líneas de caché
+        reglas_ant = np.full((len(reglas), n_var), -1, dtype=np.int8)
+        reglas_cons = np.zeros(len(reglas), dtype=np.int8)
+        for r, regla in enumerate(reglas):
+            for termino in self._terminos_and(regla.antecedent):
+                v, t = indices[(termino.parent.label, termino.label)]
+                reglas_ant[r, v] = t
+            (consecuente,) = regla.consequent
+            reglas_cons[r] = etiquetas_salida.index(consecuente.term.label)
+        
+        # Pendiente de cada término de salida por celda de la malla y su
+        # inversa (para los cruces con el corte); se calculan una sola vez
+        du = np.diff(out_universo)
+        dmf = np.diff(out_mfs, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out_pendientes = dmf / du
+            out_inv_pendientes = du / dmf
+        
+        self._tablas = (
+            ant_params, reglas_ant, reglas_cons,
+            out_universo, out_mfs, out_pendientes, out_inv_pendientes
+        )
+    
+    @classmethod
+    def _terminos_and(cls, nodo):
+        if isinstance(nodo, Term):
+            return [nodo]
+        if nodo.kind != 'and':
+            raise ValueError(f"Regla no soportada por el kernel por lotes: {nodo}")
+        return cls._terminos_and(nodo.term1) + cls._terminos_and(nodo.term2)
         
     def _create_rules(self):
        
@@ -191,39 +326,62 @@ class FuzzyCreditRiskSystem:
     
     def evaluate(self, inputs: Dict[str, float]) -> float:
        
+        if self._tablas is not None:
+            try:
+                x = np.array(
+                    [inputs.get(nombre, defecto) for nombre, defecto in zip(self._NOMBRES_ENTRADA, self._DEFECTOS_ENTRADA)],
+                    dtype=np.float32
+                )
+                np.clip(x, self._limites_min, self._limites_max, out=x)
+                return float(fuzzy_score_fila(x, *self._tablas, 50.0))
+            except (TypeError, ValueError) as e:
+                # Entradas no numéricas; un error del kernel no se oculta
+                logger.warning(f"Error en evaluación difusa: {e}")
+                return 50.0
+        
         try:
 
-            self.simulacion.input['ratio_deuda'] = np.clip(inputs.get('ratio_deuda', 0), 0, 10)
-            self.simulacion.input['antiguedad'] = np.clip(inputs.get('antiguedad', 0), 0, 120)
-            self.simulacion.input['score_sobreendeud'] = np.clip(inputs.get('score_sobreendeud', 500), 0, 1000)
-            self.simulacion.input['deuda_max'] = np.clip(inputs.get('deuda_max', 0), 0, 1)
-            self.simulacion.input['covid'] = np.clip(inputs.get('covid', 0), 0, 1)
+            # Un solo np.clip sobre el vector de las cinco entradas
+            valores = np.array(
+                [inputs.get(nombre, defecto) for nombre, defecto in zip(self._NOMBRES_ENTRADA, self._DEFECTOS_ENTRADA)],
+                dtype=np.float64
+            )
+            np.clip(valores, self._limites_min, self._limites_max, out=valores)
+            self.simulacion.inputs(dict(zip(self._NOMBRES_ENTRADA, valores.tolist())))
             
         
             self.simulacion.compute()
             
             return self.simulacion.output['riesgo_difuso']
             
-        except Exception as e:
+        except (KeyError, TypeError, ValueError) as e:
+            # KeyError: ninguna regla se activa y skfuzzy no produce salida
             logger.warning(f"Error en evaluación difusa: {e}")
             return 50.0
     
+    def evaluate_registro(self, registro: Dict) -> float:
+        """Score difuso de un registro con los nombres de columna del DataFrame."""
+        # Mismas columnas y valores por defecto que evaluate_batch, sin DataFrame
+        return self.evaluate({
+            nombre: registro[columna]
+            for nombre, columna in zip(self._NOMBRES_ENTRADA, self._COLUMNAS_ENTRADA)
+            if columna in registro
+        })
+    
     def evaluate_batch(self, df: pd.DataFrame) -> np.ndarray:
         
         logger.info(f"Evaluando sistema difuso para {len(df):,} registros...")
         
+        if self._tablas is not None:
+            scores = self.evaluate_batch_vectorized(df)
+            logger.info("Evaluación difusa completada")
+            return scores
+        
+        entradas = [dict(zip(self._NOMBRES_ENTRADA, fila)) for fila in self._matriz_entradas(df).tolist()]
+        
         scores = []
-        for idx, row in df.iterrows():
-            inputs = {
-                'ratio_deuda': row.get('ratio_deuda_ingreso', 0),
-                'antiguedad': row.get('iAntiguedadBancarizado', 0),
-                'score_sobreendeud': row.get('Score_Sobreendeudamiento', 500),
-                'deuda_max': row.get('MaxMontoInterno_normalizado', 0),
-                'covid': row.get('covid_intensity', 0)
-            }
-            
-            score = self.evaluate(inputs)
-            scores.append(score)
+        for idx, inputs in enumerate(entradas):
+            scores.append(self.evaluate(inputs))
             
             if (idx + 1) % 1000 == 0:
                 logger.info(f"Procesados: {idx + 1:,} registros")
@@ -232,18 +390,55 @@ class FuzzyCreditRiskSystem:
         
         return np.array(scores)
     
+    def evaluate_batch_vectorized(self, df: pd.DataFrame) -> np.ndarray:
+        
+        # Inferencia Mamdani sobre todas las filas a la vez a partir de las
+        # tablas de _construir_tablas, sin pasar por ControlSystemSimulation
+        if self._tablas is None:
+            raise ValueError("Las reglas del sistema no admiten la evaluación vectorizada")
+        
+        return self.evaluate_array(self._matriz_entradas(df))
+    
+    def evaluate_array(self, X: np.ndarray) -> np.ndarray:
+        """Scores difusos de una matriz (N, 5) con las entradas en el orden de _ENTRADAS."""
+        if self._tablas is None:
+            raise ValueError("Las reglas del sistema no admiten la evaluación vectorizada")
+        
+        X = np.clip(np.asarray(X, dtype=np.float32), self._limites_min, self._limites_max)
+        
+        # Filas de entrada repetidas se evalúan una sola vez: hash uint64 por
+        # fila, np.unique y reparto del resultado con el índice inverso
+        hashes = pd.util.hash_pandas_object(pd.DataFrame(X), index=False).to_numpy()
+        _, primeras, inverso = np.unique(hashes, return_index=True, return_inverse=True)
+        if len(primeras) == len(X):
+            return self._evaluar_matriz(X)
+        
+        return self._evaluar_matriz(X[primeras])[inverso]
+    
+    def _evaluar_matriz(self, X: np.ndarray) -> np.ndarray:
+        kernel = fuzzy_scores if NUMBA_ENABLED else fuzzy_scores_numpy
+        return kernel(X, *self._tablas, 50.0)
+    
+    def _matriz_entradas(self, df: pd.DataFrame) -> np.ndarray:
+        
+        # Matriz contigua (N, 5) en una sola conversión; las columnas que
+        # faltan en el DataFrame toman el valor por defecto de la entrada
+        X = df.reindex(columns=self._COLUMNAS_ENTRADA).to_numpy(dtype=np.float32, na_value=np.nan)
+        faltan = ~self._COLUMNAS_ENTRADA.isin(df.columns)
+        if faltan.any():
+            X[:, faltan] = self._DEFECTOS_ENTRADA[faltan]
+        
+        return X
+    
     def interpret_score(self, score: float) -> str:
-       
-        if score < 25:
-            return "MUY_BAJO"
-        elif score < 45:
-            return "BAJO"
-        elif score < 65:
-            return "MEDIO"
-        elif score < 85:
-            return "ALTO"
-        else:
-            return "MUY_ALTO"
+        
+        return str(self.interpret_scores(np.asarray([score]))[0])
+    
+    def interpret_scores(self, scores: np.ndarray) -> np.ndarray:
+        """Categoría de cada score: búsqueda binaria sobre los límites de la escala."""
+        # side='right': un score igual al límite pasa a la categoría siguiente
+        # (25 -> BAJO); NaN queda al final de la búsqueda (MUY_ALTO)
+        return self._ETIQUETAS_RIESGO[np.searchsorted(self._LIMITES_RIESGO, scores, side='right')]
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 #MODULO 1- Modulo de entrada
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import logging
 from colorama import Fore, Style, init
 
@@ -8,6 +9,20 @@ init(autoreset=True)
 
 logger = logging.getLogger(__name__)
 
+# Regla de validación por campo. Se escriben con & en lugar de comparaciones
+# encadenadas para que sirvan igual con un escalar y con una columna entera
+VALIDACIONES = {
+    'monto': lambda x: x > 0,
+    'PlazoReal': lambda x: (x >= 1) & (x <= 360),
+    'EdadDesembolsoNormalizada': lambda x: (x >= 18) & (x <= 100),
+    'SalarioNormalizado': lambda x: x >= 0,
+    'ScoreOriginacionMicro': lambda x: (x >= 0) & (x <= 1000),
+    'Score_Sobreendeudamiento': lambda x: (x >= 0) & (x <= 1000)
+}
+
+# Líneas rechazadas que se listan al validar un CSV; el resto solo se cuenta
+MAX_LINEAS_RECHAZADAS = 10
+
 
 class InputModule:
     
@@ -114,12 +129,21 @@ class InputModule:
             logger.error(f"Error inesperado en captura: {e}")
             return None
     
-    def cargar_desde_csv(self, ruta: str) -> pd.DataFrame:
+    def cargar_desde_csv(self, ruta: str, streaming: bool = False, chunksize: int = 50_000):
         
         try:
+            if streaming:
+                # Iterador de DataFrames de `chunksize` filas
+                lector = pd.read_csv(ruta, chunksize=chunksize)
+                logger.info(f"Archivo CSV abierto en bloques de {chunksize:,} filas")
+                return lector
+            
             df = pd.read_csv(ruta)
             logger.info(f"Archivo CSV cargado: {len(df)} solicitudes")
             print(Fore.GREEN + f"\n Cargadas {len(df)} solicitudes desde CSV\n")
+            
+            df, rechazadas = self.validar_datos_df(df)
+            self.reportar_rechazadas(rechazadas)
             return df
         except FileNotFoundError:
             print(Fore.RED + f"\n Error: Archivo no encontrado: {ruta}\n")
@@ -166,17 +190,8 @@ class InputModule:
         return datos_ejemplo
     
     def validar_datos(self, datos: Dict) -> bool:
-        validaciones = {
-            'monto': lambda x: x > 0,
-            'PlazoReal': lambda x: 1 <= x <= 360,
-            'EdadDesembolsoNormalizada': lambda x: 18 <= x <= 100,
-            'SalarioNormalizado': lambda x: x >= 0,
-            'ScoreOriginacionMicro': lambda x: 0 <= x <= 1000,
-            'Score_Sobreendeudamiento': lambda x: 0 <= x <= 1000
-        }
-        
         errores = []
-        for campo, validacion in validaciones.items():
+        for campo, validacion in VALIDACIONES.items():
             if campo in datos:
                 if not validacion(datos[campo]):
                     errores.append(f"{campo}: valor fuera de rango")
@@ -189,6 +204,35 @@ class InputModule:
         
         return True
     
+    def validar_datos_df(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        
+        # Mismas reglas que validar_datos, evaluadas sobre columnas completas:
+        # una máscara booleana por campo en lugar de una llamada por fila
+        valido = np.ones(len(df), dtype=bool)
+        for campo, validacion in VALIDACIONES.items():
+            if campo in df.columns:
+                ok = validacion(df[campo]).to_numpy(dtype=bool, na_value=False)
+                if not ok.all():
+                    logger.warning(f"{campo}: {(~ok).sum():,} filas fuera de rango")
+                valido &= ok
+        
+        return df[valido], df[~valido]
+    
+    def reportar_rechazadas(self, rechazadas: pd.DataFrame):
+        
+        if rechazadas.empty:
+            return
+        
+        # Línea del CSV: índice de la fila + encabezado + 1 (el índice se
+        # mantiene continuo entre los bloques de una lectura por partes)
+        lineas = [str(i + 2) for i in rechazadas.index[:MAX_LINEAS_RECHAZADAS]]
+        if len(rechazadas) > MAX_LINEAS_RECHAZADAS:
+            lineas.append("...")
+        
+        print(Fore.YELLOW + f"\n  {len(rechazadas)} solicitudes descartadas por validación "
+              f"(líneas {', '.join(lineas)})")
+        logger.warning(f"{len(rechazadas)} solicitudes descartadas por validación: líneas {', '.join(lineas)}")
+    
     def mostrar_resumen(self, datos: Dict):
      
         print("\n" + "="*60)
@@ -56,17 +56,44 @@ class CreditRiskMLModel:
         
         logger.info("Entrenamiento completado")
         
+    def get_feature_names(self):
+        # Orden de columnas con el que se entrenó el booster (None si no lo guarda)
+        if not self.is_trained:
+            return None
+        return self.model.get_booster().feature_names
+    
     def predict(self, X: pd.DataFrame) -> np.ndarray:
         if not self.is_trained:
             raise ValueError("El modelo no ha sido entrenado")
         
-        return self.model.predict(X)
+        return self.predict_proba(X).argmax(axis=1)
     
     def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
         if not self.is_trained:
             raise ValueError("El modelo no ha sido entrenado")
         
-        return self.model.predict_proba(X)
+        booster = self.model.get_booster()
+        
+        # inplace_predict sobre un array float32 contiguo: sin construir un
+        # DMatrix (copia completa de X) en cada llamada
+        if isinstance(X, pd.DataFrame):
+            if booster.feature_names is not None:
+                X = X[booster.feature_names]
+            X = X.to_numpy(dtype=np.float32, na_value=np.nan)
+        else:
+            X = np.ascontiguousarray(X, dtype=np.float32)
+        
+        try:
+            iteration_range = (0, self.model.best_iteration + 1)
+        except AttributeError:
+            iteration_range = (0, 0)
+        proba = booster.inplace_predict(X, iteration_range=iteration_range)
+        
+        # Objetivo binario: el booster devuelve solo P(clase 1)
+        if proba.ndim == 1:
+            proba = np.column_stack([1.0 - proba, proba])
+        
+        return proba
     
     def evaluate(self, X_test: pd.DataFrame, y_test: pd.Series) -> Dict:
         logger.info("Evaluando modelo...")
@@ -1,6 +1,12 @@
 #MODULO 3- Modulo de salida
+import csv
+import io
+import math
+import os
+import sys
+from collections import Counter
 import pandas as pd
-from typing import Dict
+from typing import Dict, Union
 import logging
 from colorama import Fore, Style, init
 from datetime import datetime
@@ -9,6 +15,42 @@ from config import COLORS, MESSAGES
 init(autoreset=True)
 logger = logging.getLogger(__name__)
 
+# Columnas del CSV de resultados (mismo formato que anexar_csv)
+COLUMNAS_CSV = ('fecha', 'clase', 'confianza', 'score_difuso', 'monto', 'ingreso', 'score_crediticio')
+TAM_BUFFER_CSV = 64 * 1024
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+# Color, icono y texto de mostrar_resultado_simple por clase; cualquier
+# otra clase se muestra como ALTO_RIESGO
+ESTILOS_CLASE = {
+    'BAJO_RIESGO': (Fore.GREEN, "✅", "✅ BAJO RIESGO"),
+    'MEDIO_RIESGO': (Fore.YELLOW, "⚠️", "⚠️  MEDIO RIESGO"),
+    'ALTO_RIESGO': (Fore.RED, "❌", "❌ ALTO RIESGO"),
+}
+# Color de una categoría de probabilidad según el nivel que contiene
+COLORES_CATEGORIA = {'BAJO': Fore.GREEN, 'MEDIO': Fore.YELLOW}
+
+# Las LONGITUD_BARRA + 1 barras de progreso posibles, construidas una vez
+LONGITUD_BARRA = 40
+BARRAS_PROGRESO = tuple("█" * i + "░" * (LONGITUD_BARRA - i) for i in range(LONGITUD_BARRA + 1))
+
+
+def _escribir_vectorizado(ruta: str, bloques: list):
+    
+    fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while bloques:
+            escritos = os.writev(fd, bloques)
+            # Escritura parcial: se descartan los bloques ya escritos y se
+            # recorta el primero pendiente
+            while bloques and escritos >= len(bloques[0]):
+                escritos -= len(bloques[0])
+                bloques.pop(0)
+            if bloques and escritos:
+                bloques[0] = bloques[0][escritos:]
+    finally:
+        os.close(fd)
+
 
 class OutputModule:
     
@@ -19,74 +61,71 @@ class OutputModule:
     
         self.ultimo_resultado = resultado
         
+        # Todo el reporte se acumula en memoria y sale a la consola en una
+        # sola escritura. Cada línea termina con RESET_ALL, como hacía
+        # colorama (autoreset) tras cada print
+        buffer = io.StringIO()
+        
+        def escribir(texto: str = ""):
+            buffer.write(f"{texto}{Style.RESET_ALL}\n")
+        
         clase = resultado['clase']
         confianza = resultado['confianza']
         score_difuso = resultado['score_difuso']
         probabilidades = resultado['probabilidades']
         
-        if clase == 'BAJO_RIESGO':
-            color = Fore.GREEN
-            icono = "✅"
-        elif clase == 'MEDIO_RIESGO':
-            color = Fore.YELLOW
-            icono = "⚠️"
-        else:
-            color = Fore.RED
-            icono = "❌"
+        color, icono, _ = ESTILOS_CLASE.get(clase, ESTILOS_CLASE['ALTO_RIESGO'])
         
-        print("\n" + "="*60)
-        print(color + Style.BRIGHT + "     RESULTADO DE EVALUACIÓN DE RIESGO CREDITICIO")
-        print("="*60 + "\n")
+        escribir("\n" + "="*60)
+        escribir(color + Style.BRIGHT + "     RESULTADO DE EVALUACIÓN DE RIESGO CREDITICIO")
+        escribir("="*60 + "\n")
         
-        print(f"{icono} {color + Style.BRIGHT}CLASIFICACIÓN: {clase}")
-        print(f"   Confianza del modelo: {confianza:.1f}%")
-        print(f"   Score Sistema Difuso: {score_difuso:.2f}/100")
-        print(f"   Interpretación Difusa: {resultado['interpretacion_difusa']}")
+        escribir(f"{icono} {color + Style.BRIGHT}CLASIFICACIÓN: {clase}")
+        escribir(f"   Confianza del modelo: {confianza:.1f}%")
+        escribir(f"   Score Sistema Difuso: {score_difuso:.2f}/100")
+        escribir(f"   Interpretación Difusa: {resultado['interpretacion_difusa']}")
 
-        print(f"\n Nivel de Confianza:")
-        self._mostrar_barra_progreso(confianza, 100, color)
+        escribir(f"\n Nivel de Confianza:")
+        self._mostrar_barra_progreso(confianza, 100, color, escribir=escribir)
         
 
-        print(f"\n Desglose de Probabilidades:")
+        escribir(f"\n Desglose de Probabilidades:")
         for categoria, prob in probabilidades.items():
             color_cat = self._get_color_categoria(categoria)
-            self._mostrar_barra_progreso(prob, 100, color_cat, label=categoria)
+            self._mostrar_barra_progreso(prob, 100, color_cat, label=categoria, escribir=escribir)
         
-        print(f"\n Recomendación:")
+        escribir(f"\n Recomendación:")
         mensaje = MESSAGES.get(clase, "Requiere evaluación manual")
-        print(f"   {mensaje}")
+        escribir(f"   {mensaje}")
         
         # Factores clave
-        print(f"\n Análisis de Factores Clave:")
-        self._mostrar_factores_clave(resultado)
+        escribir(f"\n Análisis de Factores Clave:")
+        self._mostrar_factores_clave(resultado, escribir)
         
         # Timestamp
-        print(f"\n Fecha de evaluación: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        escribir(f"\n Fecha de evaluación: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        print("\n" + "="*60 + "\n")
+        escribir("\n" + "="*60 + "\n")
+        
+        sys.stdout.write(buffer.getvalue())
+        sys.stdout.flush()
         
-    def _mostrar_barra_progreso(self, valor: float, maximo: float, color: str, label: str = None):
+    def _mostrar_barra_progreso(self, valor: float, maximo: float, color: str, label: str = None, escribir=print):
        
         porcentaje = (valor / maximo) * 100
-        barra_longitud = 40
-        bloques_llenos = int((porcentaje / 100) * barra_longitud)
-        barra = "█" * bloques_llenos + "░" * (barra_longitud - bloques_llenos)
+        bloques_llenos = int((porcentaje / 100) * LONGITUD_BARRA)
+        barra = BARRAS_PROGRESO[min(max(bloques_llenos, 0), LONGITUD_BARRA)]
         
         if label:
-            print(f"   {label:20s} {color}[{barra}] {porcentaje:5.1f}%")
+            escribir(f"   {label:20s} {color}[{barra}] {porcentaje:5.1f}%")
         else:
-            print(f"   {color}[{barra}] {porcentaje:5.1f}%")
+            escribir(f"   {color}[{barra}] {porcentaje:5.1f}%")
     
     def _get_color_categoria(self, categoria: str) -> str:
 
-        if 'BAJO' in categoria:
-            return Fore.GREEN
-        elif 'MEDIO' in categoria:
-            return Fore.YELLOW
-        else:
-            return Fore.RED
+        return next((color for nivel, color in COLORES_CATEGORIA.items() if nivel in categoria), Fore.RED)
     
-    def _mostrar_factores_clave(self, resultado: Dict):
+    def _mostrar_factores_clave(self, resultado: Dict, escribir=print):
 
         datos = resultado['datos_entrada']
         score_difuso = resultado['score_difuso']
@@ -123,45 +162,48 @@ class OutputModule:
         if factores:
             for factor, valor, tipo in factores[:5]:  # Top 5 factores
                 color = Fore.GREEN if tipo == "POSITIVO" else Fore.YELLOW
-                print(f"   {color}{factor}: {valor:.2f}")
+                escribir(f"   {color}{factor}: {valor:.2f}")
         else:
-            print("   Sin factores destacables")
+            escribir("   Sin factores destacables")
     
     def mostrar_resultado_simple(self, resultado: Dict):
        
         clase = resultado['clase']
         confianza = resultado['confianza']
         
-        if clase == 'BAJO_RIESGO':
-            print(f"{Fore.GREEN}✅ BAJO RIESGO ({confianza:.1f}% confianza)")
-        elif clase == 'MEDIO_RIESGO':
-            print(f"{Fore.YELLOW}⚠️  MEDIO RIESGO ({confianza:.1f}% confianza)")
-        else:
-            print(f"{Fore.RED}❌ ALTO RIESGO ({confianza:.1f}% confianza)")
+        color, _, texto = ESTILOS_CLASE.get(clase, ESTILOS_CLASE['ALTO_RIESGO'])
+        print(f"{color}{texto} ({confianza:.1f}% confianza)")
     
     def generar_reporte_pdf(self, resultado: Dict, ruta_salida: str = "reporte_riesgo.txt"):
        
         try:
-            with open(ruta_salida, 'w', encoding='utf-8') as f:
-                f.write("="*60 + "\n")
-                f.write("REPORTE DE EVALUACIÓN DE RIESGO CREDITICIO\n")
-                f.write("="*60 + "\n\n")
-                
-                f.write(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                
-                f.write(f"CLASIFICACIÓN: {resultado['clase']}\n")
-                f.write(f"Confianza: {resultado['confianza']:.1f}%\n")
-                f.write(f"Score Difuso: {resultado['score_difuso']:.2f}/100\n\n")
-                
-                f.write("PROBABILIDADES:\n")
-                for cat, prob in resultado['probabilidades'].items():
-                    f.write(f"  {cat}: {prob:.1f}%\n")
-                
-                f.write("\nRECOMENDACIÓN:\n")
-                mensaje = MESSAGES.get(resultado['clase'], "Requiere evaluación manual")
-                f.write(f"  {mensaje}\n")
-                
-                f.write("\n" + "="*60 + "\n")
+            # El reporte se arma completo en memoria y se escribe de una vez
+            partes = []
+            partes.append("="*60 + "\n")
+            partes.append("REPORTE DE EVALUACIÓN DE RIESGO CREDITICIO\n")
+            partes.append("="*60 + "\n\n")
+            
+            partes.append(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            
+            partes.append(f"CLASIFICACIÓN: {resultado['clase']}\n")
+            partes.append(f"Confianza: {resultado['confianza']:.1f}%\n")
+            partes.append(f"Score Difuso: {resultado['score_difuso']:.2f}/100\n\n")
+            
+            partes.append("PROBABILIDADES:\n")
+            partes.append(''.join(f"  {cat}: {prob:.1f}%\n" for cat, prob in resultado['probabilidades'].items()))
+            
+            partes.append("\nRECOMENDACIÓN:\n")
+            mensaje = MESSAGES.get(resultado['clase'], "Requiere evaluación manual")
+            partes.append(f"  {mensaje}\n")
+            
+            partes.append("\n" + "="*60 + "\n")
+            
+            if hasattr(os, 'writev'):
+                # POSIX: todas las partes en una sola llamada al sistema
+                _escribir_vectorizado(ruta_salida, [parte.encode('utf-8') for parte in partes])
+            else:
+                with open(ruta_salida, 'w', encoding='utf-8') as f:
+                    f.write(''.join(partes))
             
             logger.info(f"Reporte generado: {ruta_salida}")
             print(Fore.GREEN + f"\n📄 Reporte guardado en: {ruta_salida}\n")
@@ -173,20 +215,23 @@ class OutputModule:
     def exportar_csv(self, resultados: list, ruta_salida: str = "resultados_evaluacion.csv"):
      
         try:
-            df_resultados = pd.DataFrame([
-                {
-                    'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'clase': r['clase'],
-                    'confianza': r['confianza'],
-                    'score_difuso': r['score_difuso'],
-                    'monto': r['datos_entrada'].get('monto'),
-                    'ingreso': r['datos_entrada'].get('SalarioNormalizado'),
-                    'score_crediticio': r['datos_entrada'].get('ScoreOriginacionMicro')
-                }
-                for r in resultados
-            ])
-            
-            df_resultados.to_csv(ruta_salida, index=False)
+            # Filas escritas a medida que se recorren los resultados, sin
+            # construir una lista de dicts ni un DataFrame intermedio
+            fecha = datetime.now().strftime(FORMATO_FECHA)
+            with open(ruta_salida, 'w', newline='', encoding='utf-8', buffering=TAM_BUFFER_CSV) as f:
+                writer = csv.writer(f, lineterminator=os.linesep)
+                writer.writerow(COLUMNAS_CSV)
+                for r in resultados:
+                    entrada = r['datos_entrada']
+                    writer.writerow((
+                        fecha,
+                        r['clase'],
+                        r['confianza'],
+                        r['score_difuso'],
+                        entrada.get('monto'),
+                        entrada.get('SalarioNormalizado'),
+                        entrada.get('ScoreOriginacionMicro')
+                    ))
             
             logger.info(f"Resultados exportados: {ruta_salida}")
             print(Fore.GREEN + f"\n Resultados exportados a: {ruta_salida}\n")
@@ -195,33 +240,87 @@ class OutputModule:
             logger.error(f"Error al exportar CSV: {e}")
             print(Fore.RED + f"\n Error al exportar: {e}\n")
     
-    def mostrar_estadisticas_batch(self, resultados: list):
+    def anexar_csv(self, df_resultados: pd.DataFrame, ruta_salida: str, encabezado: bool, fecha: str = None):
+        
+        # Mismo formato que exportar_csv, escrito bloque a bloque. fecha: la
+        # del inicio de la exportación, formateada una vez para todos los bloques
+        if fecha is None:
+            fecha = datetime.now().strftime(FORMATO_FECHA)
+        df_bloque = pd.DataFrame({
+            'fecha': fecha,
+            'clase': df_resultados['prediccion'],
+            'confianza': df_resultados['confianza'],
+            'score_difuso': df_resultados['score_difuso'],
+            'monto': df_resultados.get('monto'),
+            'ingreso': df_resultados.get('SalarioNormalizado'),
+            'score_crediticio': df_resultados.get('ScoreOriginacionMicro')
+        })
+        df_bloque.to_csv(ruta_salida, mode='w' if encabezado else 'a', header=encabezado, index=False)
+    
+    def mostrar_estadisticas_batch(self, resultados: Union[list, pd.DataFrame]):
        
-        if not resultados:
+        # Acepta la lista de resultados o directamente el DataFrame de procesar_batch
+        if len(resultados) == 0:
             print(Fore.YELLOW + "\n  No hay resultados para mostrar\n")
             return
         
-        df = pd.DataFrame(resultados)
+        if isinstance(resultados, pd.DataFrame):
+            self.mostrar_estadisticas_acumuladas(
+                total=len(resultados),
+                conteo_clases=resultados['prediccion'].value_counts().to_dict(),
+                confianza_media=resultados['confianza'].mean(),
+                confianza_min=resultados['confianza'].min(),
+                confianza_max=resultados['confianza'].max(),
+                score_medio=resultados['score_difuso'].mean()
+            )
+            return
+        
+        # Lista de dicts: una sola pasada con acumuladores, sin DataFrame
+        conteo_clases = Counter()
+        suma_confianza = suma_score = 0.0
+        confianza_min = math.inf
+        confianza_max = -math.inf
+        for r in resultados:
+            conteo_clases[r['clase']] += 1
+            confianza = r['confianza']
+            suma_confianza += confianza
+            confianza_min = min(confianza_min, confianza)
+            confianza_max = max(confianza_max, confianza)
+            suma_score += r['score_difuso']
+        
+        total = len(resultados)
+        self.mostrar_estadisticas_acumuladas(
+            total=total,
+            conteo_clases=conteo_clases,
+            confianza_media=suma_confianza / total,
+            confianza_min=confianza_min,
+            confianza_max=confianza_max,
+            score_medio=suma_score / total
+        )
+    
+    def mostrar_estadisticas_acumuladas(self, total: int, conteo_clases: Dict,
+                                        confianza_media: float, confianza_min: float,
+                                        confianza_max: float, score_medio: float):
         
         print("\n" + "="*60)
         print(Fore.CYAN + Style.BRIGHT + "ESTADÍSTICAS DE EVALUACIÓN BATCH")
         print("="*60 + "\n")
         
-        print(f" Total de evaluaciones: {len(resultados)}")
+        print(f" Total de evaluaciones: {total}")
         
 
         print(f"\n Distribución de riesgo:")
         for clase in ['BAJO_RIESGO', 'MEDIO_RIESGO', 'ALTO_RIESGO']:
-            count = df['clase'].value_counts().get(clase, 0)
-            porcentaje = (count / len(resultados)) * 100
+            count = conteo_clases.get(clase, 0)
+            porcentaje = (count / total) * 100
             print(f"   {clase:15s}: {count:4d} ({porcentaje:5.1f}%)")
 
-        print(f"\n Confianza promedio: {df['confianza'].mean():.1f}%")
-        print(f"   Mínima: {df['confianza'].min():.1f}%")
-        print(f"   Máxima: {df['confianza'].max():.1f}%")
+        print(f"\n Confianza promedio: {confianza_media:.1f}%")
+        print(f"   Mínima: {confianza_min:.1f}%")
+        print(f"   Máxima: {confianza_max:.1f}%")
         
 
-        print(f"\n Score difuso promedio: {df['score_difuso'].mean():.2f}/100")
+        print(f"\n Score difuso promedio: {score_medio:.2f}/100")
         
         print("\n" + "="*60 + "\n")
 
@@ -1,4 +1,5 @@
 #MODULO 2- Modulo de procesamiento 
+import threading
 import pandas as pd
 import numpy as np
 from typing import Dict, Tuple
@@ -15,13 +16,16 @@ logger = logging.getLogger(__name__)
 
 class ProcessingModule:
     
-    def __init__(self, modelo_path: str = None, encoders_path: str = None):
+    def __init__(self, modelo_path: str = None, encoders_path: str = None, verbose: bool = False):
         self.fuzzy_system = None
         self.ml_model = None
         self.feature_engineer = None
+        # verbose: mensajes de procesar en consola (CLI); si no, solo al logger
+        self.verbose = verbose
         
     
         self._initialize_components(modelo_path, encoders_path)
+        self._preparar_columnas()
         
     def _initialize_components(self, modelo_path: str = None, encoders_path: str = None):
  
@@ -58,9 +62,82 @@ class ProcessingModule:
             logger.error(f"Error al cargar modelo ML: {e}")
             raise
     
-    def preprocesar_entrada(self, datos: Dict) -> pd.DataFrame:
+    def _preparar_columnas(self):
+        
+        # Esquema fijo de fase_preparacion_ml, calculado una sola vez: columnas
+        # en el orden del booster (así la matriz va a XGBoost sin reordenar),
+        # su posición y la columna base de cada *_encoded
+        self._expected_cols = tuple(
+            self.ml_model.get_feature_names()
+            or self.feature_engineer.feature_names
+            or ML_FEATURES
+        )
+        self._col_to_idx = {col: i for i, col in enumerate(self._expected_cols)}
+        self._base_map = {col: col.replace('_encoded', '') for col in self._expected_cols}
+        # Buffer de la fila del camino rápido: uno por hilo, así procesar se
+        # puede llamar desde varios hilos a la vez
+        self._hilo = threading.local()
+        
+        # Columnas con las que prepare_features escala (ver _admite_camino_rapido)
+        self._columnas_escaladas = frozenset(self.feature_engineer.numeric_features) - {'score_riesgo_difuso'}
+    
+    def _admite_camino_rapido(self, registro: Dict) -> bool:
+        
+        # registro ya lleva las columnas derivadas (_derivar_registro), igual
+        # que el DataFrame que recibe prepare_features. Con todas las columnas
+        # escaladas prepare_features sí escala y codifica los datos: ese caso
+        # sigue por el camino con DataFrame
+        return not (self._columnas_escaladas and self._columnas_escaladas.issubset(registro))
+    
+    def _derivar_registro(self, datos: Dict) -> Dict:
+        
+        # Las mismas columnas derivadas que preprocesar_entrada, sobre el dict
+        registro = dict(datos)
+        
+        if 'ratio_deuda_ingreso' not in registro:
+            ratio = registro['monto'] / (registro['SalarioNormalizado'] + 1e-5)
+            registro['ratio_deuda_ingreso'] = float(np.clip(ratio, 0, 10))
+        
+        if 'MaxMontoInterno_normalizado' not in registro and 'MaxMontoInterno' in registro:
+            registro['MaxMontoInterno_normalizado'] = float(np.clip(registro['MaxMontoInterno'] / 50000.0, 0, 1))
+        
+        registro.setdefault('covid_intensity', 0.3)
+        registro.setdefault('temperatura_anomalia', 0.0)
+        
+        return registro
+    
+    def _preprocesar_entrada_fast(self, registro: Dict) -> Tuple[np.ndarray, float]:
+        
+        # Camino de una sola solicitud sin pandas sobre el registro derivado:
+        # la fila del modelo se escribe en un buffer float32 reutilizado.
+        # Devuelve (fila, score difuso)
+        registro = dict(registro)
+        score_difuso = self.fuzzy_system.evaluate_registro(registro)
+        registro['score_riesgo_difuso'] = score_difuso
+        
+        fila = getattr(self._hilo, 'fila', None)
+        if fila is None:
+            fila = self._hilo.fila = np.empty((1, len(self._expected_cols)), dtype=np.float32)
+        fila.fill(0)
+        for col, i in self._col_to_idx.items():
+            origen = col if col in registro else self._base_map[col]
+            if origen not in registro:
+                continue
+            
+            valor = registro[origen]
+            # Texto (o None): código con las clases guardadas, como encode_text
+            if valor is None or isinstance(valor, str):
+                texto = np.array(['DESCONOCIDO' if valor is None else valor], dtype=object)
+                valor = self.feature_engineer.codificar_texto(origen, texto)[0]
+            fila[0, i] = valor
+        
+        return fila, score_difuso
+    
+    def preprocesar_entrada(self, datos) -> pd.DataFrame:
 
-        df = pd.DataFrame([datos])
+        # Una solicitud (dict) o un lote completo (DataFrame): las columnas
+        # derivadas se calculan sobre columnas enteras, sin tocar el original
+        df = datos.copy() if isinstance(datos, pd.DataFrame) else pd.DataFrame([datos])
  
         if 'ratio_deuda_ingreso' not in df.columns:
             df['ratio_deuda_ingreso'] = df['monto'] / (df['SalarioNormalizado'] + 1e-5)
@@ -82,104 +159,118 @@ class ProcessingModule:
     def fase_sistema_difuso(self, df: pd.DataFrame) -> np.ndarray:
         logger.info("FASE 1: Evaluando con sistema difuso...")
         
-        scores_difusos = []
-        
-        for idx, row in df.iterrows():
-            inputs_difusos = {
-                'ratio_deuda': row.get('ratio_deuda_ingreso', 0),
-                'antiguedad': row.get('iAntiguedadBancarizado', 0),
-                'score_sobreendeud': row.get('Score_Sobreendeudamiento', 500),
-                'deuda_max': row.get('MaxMontoInterno_normalizado', 0),
-                'covid': row.get('covid_intensity', 0)
-            }
-            
-            score = self.fuzzy_system.evaluate(inputs_difusos)
-            scores_difusos.append(score)
+        # Todas las filas en una llamada: columnas -> matriz (N, 5) -> kernel;
+        # las columnas que falten toman el mismo valor por defecto que evaluate
+        scores_difusos = self.fuzzy_system.evaluate_batch(df)
         
         logger.info(f"Sistema difuso evaluado. Score promedio: {np.mean(scores_difusos):.2f}/100")
         
         return np.array(scores_difusos)
     
-    def fase_preparacion_ml(self, df: pd.DataFrame, scores_difusos: np.ndarray) -> pd.DataFrame:
+    def fase_preparacion_ml(self, df: pd.DataFrame, scores_difusos: np.ndarray) -> np.ndarray:
         logger.info("FASE 2: Preparando features para ML...")
         
-        df_features = df.copy()
-        df_features['score_riesgo_difuso'] = scores_difusos
+        # df es siempre un DataFrame propio del llamador (preprocesar_entrada):
+        # se le añade la columna en lugar de copiarlo entero
+        df['score_riesgo_difuso'] = scores_difusos
+        df_features = df
         
         try:
             df_features = self.feature_engineer.prepare_features(df_features, fit=False)
         except Exception:
             pass
 
-        expected_cols = []
-        try:
-            if hasattr(self.feature_engineer, 'feature_names') and self.feature_engineer.feature_names:
-                expected_cols = self.feature_engineer.feature_names
-            else:
-                expected_cols = ML_FEATURES
-        except:
-            expected_cols = ML_FEATURES
-
-        from sklearn.preprocessing import LabelEncoder
-        cols_texto = df_features.select_dtypes(include=['object']).columns
-        for col in cols_texto:
-            le = LabelEncoder()
-            df_features[col] = df_features[col].fillna('DESCONOCIDO').astype(str)
-            df_features[col] = le.fit_transform(df_features[col])
-
-        df_final = pd.DataFrame(index=df_features.index)
-        
-        for col in expected_cols:
-            if col in df_features.columns:
-                df_final[col] = df_features[col]
-        
-            elif col.replace('_encoded', '') in df_features.columns:
-                col_base = col.replace('_encoded', '')
-                df_final[col] = df_features[col_base]
-            
+        # Texto con las clases guardadas en el entrenamiento (sin ajustar aquí),
+        # codificado directamente en el bloque de salida
+        cols_texto = set(df_features.select_dtypes(include=['object', 'string']).columns)
 
+        # Un bloque float32 con el esquema precalculado: cada columna presente
+        # (o su base) se copia a su posición, las demás quedan en 0
+        out = np.zeros((len(df_features), len(self._expected_cols)), dtype=np.float32)
+        for col, i in self._col_to_idx.items():
+            origen = col if col in df_features.columns else self._base_map[col]
+            if origen not in df_features.columns:
+                continue
+            if origen in cols_texto:
+                valores = df_features[origen].fillna('DESCONOCIDO').astype(str).to_numpy(dtype=object)
+                out[:, i] = self.feature_engineer.codificar_texto(origen, valores)
             else:
-                df_final[col] = 0
-
-        logger.info(f"Features alineadas: {len(df_final.columns)} variables listas para XGBoost")
-        return df_final
+                out[:, i] = df_features[origen].to_numpy(dtype=np.float32, na_value=np.nan)
+        
+        logger.info(f"Features alineadas: {out.shape[1]} variables listas para XGBoost")
+        return out
     
-    def fase_clasificacion_ml(self, X: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    def fase_clasificacion_ml(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         logger.info("FASE 3: Clasificando con modelo ML...")
         
         if not self.ml_model.is_trained:
             logger.error("El modelo ML no esta entrenado")
             raise ValueError("Modelo ML no disponible. Ejecute: python train_model.py")
         
-        predicciones = self.ml_model.predict(X)
+        # Matriz float32 contigua (una sola copia si hace falta) directa a
+        # inplace_predict, sin DataFrame ni DMatrix. Una sola pasada por los
+        # árboles: la clase es el argmax de las probabilidades
+        X = np.ascontiguousarray(X, dtype=np.float32)
         probabilidades = self.ml_model.predict_proba(X)
+        predicciones = probabilidades.argmax(axis=1)
         
         logger.info("Clasificacion ML completada")
         
         return predicciones, probabilidades
     
+    def _procesar_single(self, registro: Dict) -> Tuple[int, np.ndarray, float]:
+        
+        # FASE 1 y 2 sobre el registro derivado (fila en el buffer reutilizado)
+        # y FASE 3 directa con inplace_predict sobre esa fila. Solo válido si
+        # _admite_camino_rapido(registro)
+        if not self.ml_model.is_trained:
+            logger.error("El modelo ML no esta entrenado")
+            raise ValueError("Modelo ML no disponible. Ejecute: python train_model.py")
+        
+        fila, score_difuso = self._preprocesar_entrada_fast(registro)
+        proba_ml = self.ml_model.predict_proba(fila)[0]
+        
+        return int(proba_ml.argmax()), proba_ml, score_difuso
+    
+    def _procesar_df(self, datos: Dict) -> Tuple[int, np.ndarray, float]:
+        
+        # Preprocesar entrada
+        df = self.preprocesar_entrada(datos)
+        
+        # FASE 1: Sistema Difuso
+        scores_difusos = self.fase_sistema_difuso(df)
+        
+        # FASE 2: Preparar features para ML
+        X_ml = self.fase_preparacion_ml(df, scores_difusos)
+        
+        # FASE 3: Clasificación ML
+        predicciones, probabilidades = self.fase_clasificacion_ml(X_ml)
+        
+        return predicciones[0], probabilidades[0], scores_difusos[0]
+    
+    def _avisar(self, nivel: int, mensaje: str, color: str = ""):
+        
+        # Cada mensaje sale una sola vez: en consola con verbose, si no al logger
+        if self.verbose:
+            print(color + mensaje)
+        else:
+            logger.log(nivel, mensaje.strip())
+    
     def procesar(self, datos: Dict) -> Dict:
-        print("\n" + "="*60)
-        print(Fore.CYAN + Style.BRIGHT + "PROCESAMIENTO HIBRIDO INICIADO")
-        print("="*60 + "\n")
+        if self.verbose:
+            print("\n" + "="*60)
+            print(Fore.CYAN + Style.BRIGHT + "PROCESAMIENTO HIBRIDO INICIADO")
+            print("="*60 + "\n")
         
         try:
-            # Preprocesar entrada
-            df = self.preprocesar_entrada(datos)
-            
-            # FASE 1: Sistema Difuso
-            scores_difusos = self.fase_sistema_difuso(df)
-            score_difuso = scores_difusos[0]
-            
-            # FASE 2: Preparar features para ML
-            X_ml = self.fase_preparacion_ml(df, scores_difusos)
-            
-            # FASE 3: Clasificación ML
-            predicciones, probabilidades = self.fase_clasificacion_ml(X_ml)
+            # Una solicitud: dict y arrays sin pandas siempre que se pueda
+            registro = self._derivar_registro(datos)
+            if self._admite_camino_rapido(registro):
+                prediccion_ml, proba_ml, score_difuso = self._procesar_single(registro)
+            else:
+                prediccion_ml, proba_ml, score_difuso = self._procesar_df(datos)
             
             # Resultado crudo del ML
-            prediccion_ml = predicciones[0]
-            proba_ml = probabilidades[0]
             clase_ml = TARGET_MAPPING.get(prediccion_ml, f"CLASE_{prediccion_ml}")
             confianza_ml = proba_ml.max() * 100
             
@@ -191,7 +282,7 @@ class ProcessingModule:
             
            
             if score_difuso > 76:
-                print(Fore.YELLOW + f"⚠️ ALERTA: Riesgo Difuso Crítico ({score_difuso:.2f}). Activando protocolo de rechazo.")
+                self._avisar(logging.WARNING, f"⚠️ ALERTA: Riesgo Difuso Crítico ({score_difuso:.2f}). Activando protocolo de rechazo.", Fore.YELLOW)
                 if clase_ml == 'BAJO_RIESGO':
                     clase_final = 'ALTO_RIESGO'
                     confianza_final = max(confianza_ml, score_difuso)
@@ -202,7 +293,7 @@ class ProcessingModule:
             elif 50 <= score_difuso <= 75:
                 # Si el ML dice BAJO, pero el difuso está preocupado (Medio)
                 if clase_ml == 'BAJO_RIESGO':
-                    print(Fore.CYAN + f"ℹ️ AJUSTE: Cliente en zona gris (Difuso: {score_difuso:.2f}). Asignando Riesgo Medio.")
+                    self._avisar(logging.INFO, f"ℹ️ AJUSTE: Cliente en zona gris (Difuso: {score_difuso:.2f}). Asignando Riesgo Medio.", Fore.CYAN)
                     clase_final = 'MEDIO_RIESGO'
                     confianza_final = score_difuso # La confianza es el score difuso
                     nota_decision = "AJUSTE HÍBRIDO (ZONA GRIS)"
@@ -228,15 +319,17 @@ class ProcessingModule:
             }
             
             if nota_decision != "Basada en Modelo ML":
-                print(Fore.RED + f" DECISIÓN FINAL MODIFICADA: {nota_decision}")
+                self._avisar(logging.INFO, f" DECISIÓN FINAL MODIFICADA: {nota_decision}", Fore.RED)
             
-            print(Fore.GREEN + "\n PROCESAMIENTO COMPLETADO EXITOSAMENTE\n")
+            if self.verbose:
+                print(Fore.GREEN + "\n PROCESAMIENTO COMPLETADO EXITOSAMENTE\n")
             
             return resultado
             
         except Exception as e:
             logger.error(f"Error en procesamiento: {e}")
-            print(Fore.RED + f"\n Error en procesamiento: {e}\n")
+            if self.verbose:
+                print(Fore.RED + f"\n Error en procesamiento: {e}\n")
             raise
     
     def procesar_batch(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -244,29 +337,17 @@ class ProcessingModule:
         logger.info(f"Procesando {len(df)} solicitudes en batch...")
         
 
-        df_ml_ready_list = []
-        scores_list = []
-        
-        # 1. Difuso
-        for idx, row in df.iterrows():
-             # Convertir fila a dict
-             drow = row.to_dict()
-
-             df_unit = self.preprocesar_entrada(drow)
-             scores = self.fase_sistema_difuso(df_unit)
-             scores_list.append(scores[0])
-             
-             # ML Prep
-             x_ml = self.fase_preparacion_ml(df_unit, scores)
-             df_ml_ready_list.append(x_ml)
-             
-        if df_ml_ready_list:
-            X_batch = pd.concat(df_ml_ready_list, ignore_index=True)
+        # Cada fase una sola vez sobre el lote completo
+        if len(df):
+            df_entrada = self.preprocesar_entrada(df)
+            scores_difusos = self.fase_sistema_difuso(df_entrada)
+            X_batch = self.fase_preparacion_ml(df_entrada, scores_difusos)
             predicciones, probabilidades = self.fase_clasificacion_ml(X_batch)
             
-            df['prediccion'] = [TARGET_MAPPING.get(p, f"CLASE_{p}") for p in predicciones]
+            etiquetas = [TARGET_MAPPING.get(i, f"CLASE_{i}") for i in range(probabilidades.shape[1])]
+            df['prediccion'] = pd.Categorical.from_codes(predicciones, categories=etiquetas)
             df['confianza'] = probabilidades.max(axis=1) * 100
-            df['score_difuso'] = scores_list
+            df['score_difuso'] = scores_difusos
         
         logger.info("Procesamiento batch completado")
         
@@ -301,7 +382,7 @@ if __name__ == "__main__":
     }
     
     try:
-        procesador = ProcessingModule(modelo_path=MODEL_FILE, encoders_path=ENCODERS_FILE)
+        procesador = ProcessingModule(modelo_path=MODEL_FILE, encoders_path=ENCODERS_FILE, verbose=True)
         resultado = procesador.procesar(datos_prueba)
         print("\nResultado:")
         print(resultado)
@@ -0,0 +1,49 @@
+"""
+Compilación anticipada (AOT) del kernel difuso de una fila
+
+Genera src/fuzzy_kernels_aot.*.so con el mismo _score_fila de
+fuzzy_kernels compilado a código nativo. Con el módulo presente,
+FuzzyCreditRiskSystem.evaluate lo usa para el score de un solo cliente
+sin compilar nada con JIT en tiempo de ejecución. El módulo generado no
+depende de Numba, pero fuzzy_kernels sigue importando Numba si está
+instalado, porque lo usa el kernel por lotes (evaluate_batch).
+
+Las tablas (funciones de pertenencia y reglas) se siguen pasando como
+arrays desde el sistema difuso: no hace falta recompilar si cambian los
+términos o las reglas, solo si cambia fuzzy_kernels._score_fila o el tipo
+de las tablas.
+
+Nota: numba.pycc está obsoleto en Numba y se eliminará en una versión
+futura. Con Numba 0.68 compila y el score AOT coincide exactamente con el
+JIT; si pycc deja de existir, evaluate sigue usando el kernel JIT (o NumPy).
+
+Ejecutar: python tools/build_fuzzy_aot.py
+"""
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+from numba.pycc import CC
+
+from fuzzy_kernels import NUMBA_ENABLED, MODULO_AOT, FIRMA_AOT
+
+if not NUMBA_ENABLED:
+    sys.exit("❌ Numba no está instalado: no se puede compilar el kernel")
+
+from fuzzy_kernels import _score_fila
+
+cc = CC(MODULO_AOT)
+cc.output_dir = str(SRC_DIR)
+cc.verbose = True
+
+# py_func: se compila la función Python original; las funciones njit a las
+# que llama (trimf, _centroide, ...) quedan incluidas en el módulo
+cc.export('score_fila', FIRMA_AOT)(_score_fila.py_func)
+
+
+if __name__ == "__main__":
+    print(f"🔧 Compilando {MODULO_AOT} en {SRC_DIR} ...")
+    cc.compile()
+    print(f"✅ Kernel AOT generado: {MODULO_AOT}")
@@ -0,0 +1,96 @@
+"""
+Verificación del camino rápido de ProcessingModule.procesar
+
+Lee filas reales del CSV de créditos y comprueba dos cosas:
+
+- para cada fila que procesar manda al camino rápido sin pandas
+  (_procesar_single), sus probabilidades son las del camino con DataFrame
+  (_procesar_df), que aplica prepare_features igual que procesar_batch;
+- procesar da, fila a fila, la misma clase ML, confianza y score difuso
+  que procesar_batch sobre el lote completo.
+
+Ejecutar: python tools/verificar_camino_rapido.py [ruta_csv] [num_filas]
+"""
+import io
+import sys
+import contextlib
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+from config import CREDITO_FILE, MODEL_FILE, ENCODERS_FILE
+
+from processing_module import ProcessingModule
+
+# Columnas del CSV que no son datos de la solicitud
+COLUMNAS_EXCLUIDAS = ['Class_202309FM', 'fechaotorgamiento']
+
+
+def verificar(ruta: Path, num_filas: int) -> int:
+
+    df = pd.read_csv(ruta, sep=';', encoding='utf-8-sig', nrows=num_filas)
+    df = df.drop(columns=COLUMNAS_EXCLUIDAS, errors='ignore')
+
+    procesador = ProcessingModule(modelo_path=MODEL_FILE, encoders_path=ENCODERS_FILE)
+
+    distintas = 0
+    rapidas = 0
+    for i, datos in enumerate(df.to_dict('records')):
+        # Las filas que procesar manda al camino con DataFrame coinciden por
+        # construcción: solo se comparan las del camino rápido
+        registro = procesador._derivar_registro(datos)
+        if not procesador._admite_camino_rapido(registro):
+            continue
+        rapidas += 1
+
+        _, proba, _ = procesador._procesar_single(registro)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, proba_df, _ = procesador._procesar_df(datos)
+
+        if not np.allclose(proba, proba_df, rtol=0, atol=1e-6):
+            distintas += 1
+            print(f"❌ Fila {i}: camino rápido {np.round(proba, 4)} vs DataFrame {np.round(proba_df, 4)}")
+
+    print(f"Filas comparadas: {len(df):,} (camino rápido: {rapidas:,})")
+    print(f"Filas con probabilidades distintas: {distintas:,}")
+    return distintas + verificar_batch(procesador, df)
+
+
+def verificar_batch(procesador: ProcessingModule, df: pd.DataFrame) -> int:
+
+    lote = procesador.procesar_batch(df.copy())
+    clases = lote['prediccion'].cat.codes.to_numpy()
+
+    distintas = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultados = [procesador.procesar(datos) for datos in df.to_dict('records')]
+
+    for i, resultado in enumerate(resultados):
+        iguales = (
+            resultado['prediccion_numerica'] == clases[i]
+            and np.isclose(resultado['score_difuso'], lote['score_difuso'].iloc[i], equal_nan=True)
+        )
+        # Los ajustes híbridos (veto, zona gris) reemplazan la confianza del ML
+        if resultado['nota_decision'] == "Basada en Modelo ML":
+            iguales = iguales and np.isclose(resultado['confianza'], lote['confianza'].iloc[i], rtol=0, atol=1e-4)
+        if not iguales:
+            distintas += 1
+            print(f"❌ Fila {i}: procesar ({resultado['prediccion_numerica']}, {resultado['confianza']:.4f}) "
+                  f"vs procesar_batch ({clases[i]}, {lote['confianza'].iloc[i]:.4f})")
+
+    print(f"Filas distintas entre procesar y procesar_batch: {distintas:,}")
+    return distintas
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    ruta = Path(sys.argv[1]) if len(sys.argv) > 1 else CREDITO_FILE
+    num_filas = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    sys.exit(1 if verificar(ruta, num_filas) else 0)
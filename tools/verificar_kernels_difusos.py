@@ -0,0 +1,176 @@
+"""
+Verificación de los kernels difusos contra scikit-fuzzy
+
+Compara fuzzy_scores (Numba), fuzzy_scores_numpy y fuzzy_score_fila con
+ControlSystemSimulation sobre entradas aleatorias y sobre entradas en los
+vértices de las funciones de pertenencia:
+
+- los tres kernels coinciden entre sí y con skfuzzy dentro de TOLERANCIA;
+- las filas con alguna entrada en una celda de la malla que contiene un
+  vértice fuera de la malla son excepciones conocidas (ver el docstring de
+  fuzzy_kernels): se cuentan aparte y no se tratan como fallo;
+- el ejemplo documentado de esa divergencia sigue dando 50.0 en el kernel
+  y 75.0 en skfuzzy; si cambia, hay que actualizar la documentación.
+
+Ejecutar: python tools/verificar_kernels_difusos.py [num_filas]
+"""
+import sys
+import logging
+from pathlib import Path
+
+import numpy as np
+from skfuzzy import control as ctrl
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+sys.path.insert(0, str(SRC_DIR))
+
+from fuzzy_kernels import NUMBA_ENABLED, fuzzy_score_fila, fuzzy_scores_numpy
+from fuzzy_system import FuzzyCreditRiskSystem
+
+if NUMBA_ENABLED:
+    from fuzzy_kernels import fuzzy_scores
+
+# Diferencia máxima admitida en el score (escala 0-100): las tablas del
+# kernel van en float32
+TOLERANCIA = 1e-4
+VALOR_DEFECTO = 50.0
+
+# Entrada documentada en fuzzy_kernels: covid en la celda (0.69, 0.70]
+EJEMPLO_DIVERGENCIA = (6.1667, 0, 659.95, 0.0765, 0.6937)
+SCORES_EJEMPLO = (50.0, 75.0)  # (kernel, skfuzzy)
+
+
+def score_skfuzzy(simulacion, fila) -> float:
+
+    # API pública de skfuzzy; sin reglas activas output queda vacío y se usa
+    # el mismo valor neutro que los kernels
+    simulacion.inputs(dict(zip(FuzzyCreditRiskSystem._NOMBRES_ENTRADA, map(float, fila))))
+    simulacion.compute()
+    return simulacion.output.get('riesgo_difuso', VALOR_DEFECTO)
+
+
+def celdas_excepcion(sistema: FuzzyCreditRiskSystem) -> list:
+
+    # (variable, inicio, fin) de cada celda del universo con un vértice
+    # estrictamente dentro: ahí skfuzzy interpola en lugar de usar la fórmula
+    celdas = []
+    for v, antecedente in enumerate(sistema._antecedentes):
+        universo = antecedente.universe
+        for etiqueta in antecedente.terms:
+            for vertice in sistema._params_trimf[(antecedente.label, etiqueta)]:
+                i = np.searchsorted(universo, vertice)
+                if 0 < i < len(universo) and universo[i] != vertice:
+                    celdas.append((v, universo[i - 1], universo[i]))
+    return sorted(set(celdas))
+
+
+def en_excepcion(X: np.ndarray, celdas: list) -> np.ndarray:
+
+    mascara = np.zeros(len(X), dtype=bool)
+    for v, inicio, fin in celdas:
+        mascara |= (X[:, v] > inicio) & (X[:, v] <= fin)
+    return mascara
+
+
+def entradas_aleatorias(rng, sistema: FuzzyCreditRiskSystem, num_filas: int) -> np.ndarray:
+
+    return rng.uniform(sistema._limites_min, sistema._limites_max, (num_filas, len(sistema._limites_min)))
+
+
+def entradas_vertices(rng, sistema: FuzzyCreditRiskSystem, num_filas: int) -> np.ndarray:
+
+    # Cada entrada cae en un vértice de algún término con probabilidad 1/2
+    X = entradas_aleatorias(rng, sistema, num_filas)
+    for v, antecedente in enumerate(sistema._antecedentes):
+        vertices = np.unique([
+            vertice
+            for etiqueta in antecedente.terms
+            for vertice in sistema._params_trimf[(antecedente.label, etiqueta)]
+        ])
+        en_vertice = rng.random(num_filas) < 0.5
+        X[en_vertice, v] = rng.choice(vertices, en_vertice.sum())
+    return X
+
+
+def comparar(nombre: str, X: np.ndarray, sistema: FuzzyCreditRiskSystem, simulacion, celdas: list) -> int:
+
+    # skfuzzy recibe las entradas tal cual; los kernels, en float32 como en
+    # evaluate y evaluate_batch
+    tablas = sistema._tablas
+    X32 = X.astype(np.float32)
+    referencia = np.array([score_skfuzzy(simulacion, fila) for fila in X])
+    kernels = {
+        'fuzzy_scores_numpy': fuzzy_scores_numpy(X32, *tablas, VALOR_DEFECTO),
+        'fuzzy_score_fila': np.array([fuzzy_score_fila(fila, *tablas, VALOR_DEFECTO) for fila in X32]),
+    }
+    if NUMBA_ENABLED:
+        kernels['fuzzy_scores'] = fuzzy_scores(X32, *tablas, VALOR_DEFECTO)
+
+    excepcion = en_excepcion(X, celdas)
+    print(f"\n{nombre}: {len(X):,} filas ({excepcion.sum():,} en celdas de excepción)")
+
+    fallos = 0
+    for kernel, scores in kernels.items():
+        distintas = np.abs(scores - referencia) > TOLERANCIA
+        inesperadas = distintas & ~excepcion
+        fallos += inesperadas.sum()
+        print(f"  {kernel:20s}: máx. diferencia fuera de excepciones "
+              f"{np.abs(scores - referencia)[~excepcion].max():.2e}, "
+              f"distintas {inesperadas.sum():,} (+{(distintas & excepcion).sum():,} conocidas)")
+        for i in np.flatnonzero(inesperadas)[:5]:
+            print(f"    ❌ {np.round(X[i], 4).tolist()}: {kernel} {scores[i]:.4f} vs skfuzzy {referencia[i]:.4f}")
+
+        # Entre kernels no hay excepciones: usan las mismas tablas
+        if kernel != 'fuzzy_scores_numpy':
+            entre_kernels = np.abs(scores - kernels['fuzzy_scores_numpy']) > TOLERANCIA
+            fallos += entre_kernels.sum()
+            if entre_kernels.any():
+                print(f"    ❌ {entre_kernels.sum():,} filas distintas de fuzzy_scores_numpy")
+
+    return int(fallos)
+
+
+def verificar_ejemplo(sistema: FuzzyCreditRiskSystem, simulacion) -> int:
+
+    obtenidos = (
+        fuzzy_score_fila(np.array(EJEMPLO_DIVERGENCIA, dtype=np.float32), *sistema._tablas, VALOR_DEFECTO),
+        score_skfuzzy(simulacion, EJEMPLO_DIVERGENCIA)
+    )
+    print(f"\nEjemplo documentado {EJEMPLO_DIVERGENCIA}: kernel {obtenidos[0]:.4f}, skfuzzy {obtenidos[1]:.4f}")
+    if not np.allclose(obtenidos, SCORES_EJEMPLO, rtol=0, atol=TOLERANCIA):
+        print(f"  ❌ Se esperaba {SCORES_EJEMPLO}: revisar la nota de divergencia de fuzzy_kernels")
+        return 1
+    return 0
+
+
+def verificar(num_filas: int) -> int:
+
+    sistema = FuzzyCreditRiskSystem()
+    if sistema._tablas is None:
+        print("❌ Las reglas no se pueden tabular: no hay kernels que comparar")
+        return 1
+
+    simulacion = ctrl.ControlSystemSimulation(sistema.sistema, cache=False)
+    celdas = celdas_excepcion(sistema)
+
+    print("Celdas de excepción conocidas:")
+    for v, inicio, fin in celdas:
+        print(f"  {sistema._NOMBRES_ENTRADA[v]:18s} ({float(inicio)!r}, {float(fin)!r}]")
+    if not NUMBA_ENABLED:
+        print("Numba no instalado: se omite fuzzy_scores")
+
+    rng = np.random.default_rng(0)
+    fallos = comparar("Entradas aleatorias", entradas_aleatorias(rng, sistema, num_filas), sistema, simulacion, celdas)
+    fallos += comparar("Entradas en vértices", entradas_vertices(rng, sistema, num_filas), sistema, simulacion, celdas)
+    fallos += verificar_ejemplo(sistema, simulacion)
+
+    print(f"\n{'✅ Sin diferencias inesperadas' if not fallos else f'❌ Diferencias inesperadas: {fallos:,}'}")
+    return fallos
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    num_filas = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    sys.exit(1 if verificar(num_filas) else 0)
@@ -12,7 +12,7 @@ from pathlib import Path
 from colorama import Fore, Style, init
 
 # Importar módulos del proyecto
-from data_loader import load_datasets
+from data_loader import load_datasets, PYARROW_ENABLED
 from data_preprocessing import preprocess_all_data
 from fuzzy_system import FuzzyCreditRiskSystem
 from feature_engineering import FeatureEngineer, prepare_train_test_split
@@ -61,8 +61,15 @@ def entrenar_modelo_completo(sample_size=None, guardar_datos=True):
         # Guardar dataset procesado
         if guardar_datos:
             PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
-            df_procesado.to_csv(INTEGRATED_FILE, index=False)
-            logger.info(f"Dataset procesado guardado en: {INTEGRATED_FILE}")
+            # Parquet: columnas tipadas y comprimidas, se relee sin parsear texto.
+            # Sin pyarrow se mantiene el CSV con el mismo nombre base
+            if PYARROW_ENABLED:
+                ruta_integrado = INTEGRATED_FILE
+                df_procesado.to_parquet(ruta_integrado, compression='snappy', engine='pyarrow', index=False)
+            else:
+                ruta_integrado = INTEGRATED_FILE.with_suffix('.csv')
+                df_procesado.to_csv(ruta_integrado, index=False)
+            logger.info(f"Dataset procesado guardado en: {ruta_integrado}")
         
         # ============= PASO 3: SISTEMA DIFUSO =============
         print(Fore.YELLOW + Style.BRIGHT + "\nPASO 3: EVALUANDO SISTEMA DIFUSO")
@@ -95,22 +102,18 @@ def entrenar_modelo_completo(sample_size=None, guardar_datos=True):
         
        
         # ==============================================================================
-        from sklearn.preprocessing import LabelEncoder
-        
-        cols_texto = X_completo.select_dtypes(include=['object']).columns
+        cols_texto = [
+            col for col in X_completo.select_dtypes(include=['object', 'string']).columns
+            if col != TARGET_COLUMN
+        ]
         
         if len(cols_texto) > 0:
             print(Fore.CYAN + f"\nℹ️  Detectadas {len(cols_texto)} columnas de texto. Codificando automáticamente...")
             
-            for col in cols_texto:
-                # No tocamos la columna objetivo
-                if col == TARGET_COLUMN:
-                    continue
-                    
-                print(f"   🔧 Convirtiendo '{col}' de Texto -> Números...")
-                le_cat = LabelEncoder()
-                X_completo[col] = X_completo[col].fillna('DESCONOCIDO').astype(str)
-                X_completo[col] = le_cat.fit_transform(X_completo[col])
+            # Los encoders quedan en feature_engineer y se guardan con los
+            # transformers: la inferencia reutiliza las mismas clases
+            X_completo = feature_engineer.encode_text(X_completo, cols_texto, fit=True)
+            print(f"   🔧 Convertidas de Texto -> Números: {', '.join(cols_texto)}")
         # ==============================================================================
 
         logger.info(f"Features preparadas: {len(X_completo.columns)-1} variables")
@@ -143,8 +146,8 @@ def entrenar_modelo_completo(sample_size=None, guardar_datos=True):
         print(Fore.CYAN + "\n📊 TOP 10 FEATURES MÁS IMPORTANTES:")
         print("-" * 70)
         top_features = modelo.get_top_features(10)
-        for idx, row in top_features.iterrows():
-            print(f"   {row['feature']:30s}: {row['importance']:.4f}")
+        for feature, importance in top_features[['feature', 'importance']].itertuples(index=False, name=None):
+            print(f"   {feature:30s}: {importance:.4f}")
         
         # ============= PASO 8: GUARDAR MODELO =============
         print(Fore.YELLOW + Style.BRIGHT + "\nPASO 8: GUARDANDO MODELO")
@@ -1,13 +1,23 @@
-import requests
 import os
 import pandas as pd
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from typing import Dict, Optional, Tuple
 import logging
-from functools import lru_cache
+import threading
+import time
 from pathlib import Path
 from io import StringIO
 import random
+import re
+from types import MappingProxyType
+
+try:
+    import pyarrow as pa
+    PYARROW_ENABLED = True
+except ImportError:
+    PYARROW_ENABLED = False
 
 # 1. Configurar el logger al inicio
 logger = logging.getLogger(__name__)
@@ -17,6 +27,34 @@ DATA_PATH_BASE = Path(__file__).parent.parent / 'raw'
 COVID_DATASET = DATA_PATH_BASE / 'dataset_covid.csv'
 TEMP_DATASET = DATA_PATH_BASE / 'dataset_temperatura.csv'
 
+# Caché de los datos leídos (COVID y temperatura): 1 hora si la lectura
+# funcionó y 60 s si falló, para no reintentar en cada solicitud. Un lock
+# por clave evita lecturas simultáneas del mismo archivo cuando la caché
+# expira con varias solicitudes en curso, sin que la lectura de un archivo
+# bloquee a las demás claves; _DATOS_LOCK solo protege la creación de locks
+DATOS_CACHE_TTL = 3600
+DATOS_CACHE_TTL_FALLO = 60
+_DATOS_CACHE = {}
+_DATOS_LOCKS = defaultdict(threading.Lock)
+_DATOS_LOCK = threading.Lock()
+
+
+def _obtener_cacheado(clave: str, cargar):
+    """
+    Valor vigente de la caché o, si expiró, el que devuelve cargar() -> (valor, ttl)
+    """
+    with _DATOS_LOCK:
+        lock = _DATOS_LOCKS[clave]
+    
+    with lock:
+        entrada = _DATOS_CACHE.get(clave)
+        if entrada is not None and time.monotonic() < entrada[1]:
+            return entrada[0]
+        
+        valor, ttl = cargar()
+        _DATOS_CACHE[clave] = (valor, time.monotonic() + ttl)
+        return valor
+
 try:
     from dotenv import load_dotenv
     dotenv_path = Path(__file__).parent.parent / '.env'
@@ -35,53 +73,200 @@ CLASIFICACION_RIESGO_BASE = {
     'APURIMAC': 'BAJO_RIESGO', 'MOQUEGUA': 'MEDIO_RIESGO', 'HUANCAVELICA': 'BAJO_RIESGO', 'AMAZONAS': 'BAJO_RIESGO',
     'MADRE DE DIOS': 'MEDIO_RIESGO'
 }
+
+
+# Tablas fijas de la simulación de respaldo: se crean una sola vez al cargar
+# el módulo (de solo lectura) en lugar de en cada llamada
+_INTENSIDAD_SIMULADA = MappingProxyType({
+    'LIMA': 0.85, 'CALLAO': 0.75, 'AREQUIPA': 0.45, 'LA LIBERTAD': 0.55, 'PIURA': 0.50,
+    'CUSCO': 0.40, 'LAMBAYEQUE': 0.60, 'JUNIN': 0.35, 'PUNO': 0.30, 'LORETO': 0.30,
+    'ANCASH': 0.35, 'ICA': 0.40, 'UCAYALI': 0.38, 'SAN MARTIN': 0.32, 'CAJAMARCA': 0.28,
+    'HUANUCO': 0.25, 'AYACUCHO': 0.22, 'TACNA': 0.35, 'PASCO': 0.20, 'TUMBES': 0.30,
+    'APURIMAC': 0.18, 'MOQUEGUA': 0.25, 'HUANCAVELICA': 0.15, 'AMAZONAS': 0.18, 'MADRE DE DIOS': 0.20
+})
+
+_CASOS_SIMULADOS = MappingProxyType({
+    'LIMA': 950000, 'CALLAO': 180000, 'AREQUIPA': 120000, 'LA LIBERTAD': 140000, 'PIURA': 110000,
+    'CUSCO': 95000, 'LAMBAYEQUE': 130000, 'JUNIN': 85000, 'PUNO': 70000, 'LORETO': 68000,
+    'ANCASH': 75000, 'ICA': 82000, 'UCAYALI': 72000, 'SAN MARTIN': 65000, 'CAJAMARCA': 60000,
+    'HUANUCO': 52000, 'AYACUCHO': 48000, 'TACNA': 55000, 'PASCO': 42000, 'TUMBES': 50000,
+    'APURIMAC': 38000, 'MOQUEGUA': 45000, 'HUANCAVELICA': 32000, 'AMAZONAS': 35000, 'MADRE DE DIOS': 40000
+})
+
+_TEMP_PROMEDIO = MappingProxyType({
+    'LIMA': 19.0, 'AREQUIPA': 14.0, 'CUSCO': 11.5, 'PIURA': 24.0, 'LAMBAYEQUE': 22.0,
+    'LA LIBERTAD': 19.5, 'JUNIN': 11.0, 'ICA': 20.0, 'PUNO': 8.5, 'LORETO': 26.0,
+    'UCAYALI': 25.5, 'CALLAO': 20.0, 'ANCASH': 15.0, 'CAJAMARCA': 15.0, 'TACNA': 18.0
+})
+
+_ANOMALIA_BASE = MappingProxyType({
+    'LIMA': 0.5, 'CALLAO': 0.5, 'AREQUIPA': 0.8, 'CUSCO': -0.3, 'PIURA': 1.2,
+    'LA LIBERTAD': 0.9, 'LAMBAYEQUE': 1.0, 'TUMBES': 1.3, 'LORETO': 1.1, 'UCAYALI': 1.0,
+    'SAN MARTIN': 0.9, 'MADRE DE DIOS': 1.1, 'JUNIN': -0.2, 'PASCO': -0.4, 'HUANUCO': 0.2,
+    'PUNO': -0.5, 'TACNA': 0.7, 'MOQUEGUA': 0.6, 'ICA': 0.8, 'ANCASH': 0.1,
+    'CAJAMARCA': 0.0, 'AYACUCHO': -0.1, 'HUANCAVELICA': -0.3, 'APURIMAC': -0.2, 'AMAZONAS': 0.4
+})
 # =========================================================================================
 
 class MinisterioSaludAPI:
     
     DEPARTAMENTOS_MAP = CLASIFICACION_RIESGO_BASE.keys()
+    
+    # Un único patrón con todos los departamentos, el más largo primero para
+    # que 'HUANCAVELICA' no se reconozca como 'ICA'. Sin límites de palabra:
+    # 'LIMASUR' debe seguir contando como 'LIMA'
+    DEPARTAMENTOS_RE = re.compile('|'.join(
+        re.escape(d) for d in sorted(DEPARTAMENTOS_MAP, key=len, reverse=True)
+    ))
 
     @classmethod
-    @lru_cache(maxsize=1, max_age=3600)
     def get_latest_data(cls) -> pd.DataFrame:
         """
-        Lectura directa del CSV local 'dataset_covid.csv'
+        Columna de ubicación del CSV local 'dataset_covid.csv', con caché por tiempo
+        """
+        return cls._get_entrada_cache()[0]
+
+    @classmethod
+    def _get_entrada_cache(cls) -> Tuple[pd.DataFrame, Optional[Dict]]:
+        """
+        (df, conteos) vigentes; los conteos se calculan una vez por lectura
+        """
+        return _obtener_cacheado('covid', cls._cargar_datos_covid)
+
+    @classmethod
+    def _cargar_datos_covid(cls) -> Tuple[Tuple[pd.DataFrame, Optional[Dict]], int]:
+        df, ttl = cls._leer_datos_covid()
+        conteos = cls._calcular_conteos(df) if not df.empty else None
+        return (df, conteos), ttl
+
+    @classmethod
+    def _calcular_conteos(cls, df: pd.DataFrame) -> Optional[Dict]:
+        """
+        Registros por ubicación (en mayúsculas) y por departamento estándar
+        """
+        try:
+            # Asumimos que la columna 'location' o similar es la segunda columna, como en el CSV
+            location_col = df.columns[1] if len(df.columns) > 1 else df.columns[0]
+            
+            por_ubicacion = df[location_col].astype(str).str.upper().value_counts().to_dict()
+            
+            # Mapeo de nombres cortos a nombres estandarizados (p. ej., "LIMASUR" -> "LIMA"):
+            # cada departamento toma la primera ubicación que le corresponde
+            por_departamento = {}
+            for location_raw, count in df.groupby(location_col).size().items():
+                location_upper = str(location_raw).upper().strip()
+                dept = cls._departamento_de(location_upper)
+                if dept and dept not in por_departamento:
+                    por_departamento[dept] = int(count)
+            
+            return {'por_ubicacion': por_ubicacion, 'por_departamento': por_departamento}
+            
+        except Exception as e:
+            logger.error(f"❌ Error al agrupar datos de COVID: {e}. Usando simulación.")
+            return None
+
+    @classmethod
+    def _departamento_de(cls, location_upper: str) -> Optional[str]:
+        """
+        Departamento estándar contenido en la ubicación o, si es una
+        abreviatura (p. ej. 'LIM'), el primero que la contiene
+        """
+        m = cls.DEPARTAMENTOS_RE.search(location_upper)
+        if m:
+            return m.group(0)
+        if not location_upper:
+            return None
+        return next((d for d in cls.DEPARTAMENTOS_MAP if location_upper in d), None)
+
+    @classmethod
+    def _leer_datos_covid(cls) -> Tuple[pd.DataFrame, int]:
+        """
+        Lectura directa del CSV local; devuelve el DataFrame y su tiempo en caché
         """
         if COVID_DATASET.exists():
             try:
-                # Lectura del archivo local
-                df = pd.read_csv(COVID_DATASET)
+                df = cls._leer_parquet_covid()
+                if df is None:
+                    # Solo se usa la columna de ubicación: se lee el encabezado y
+                    # después únicamente esa columna
+                    columnas = pd.read_csv(COVID_DATASET, nrows=0).columns
+                    location_col = columnas[1] if len(columnas) > 1 else columnas[0]
+                    df = cls._leer_columna_covid(location_col)
+                    cls._guardar_parquet_covid(df)
                 logger.info(f"✅ Datos COVID-19 cargados del local: {len(df):,} registros")
-                return df
+                return df, DATOS_CACHE_TTL
             except Exception as e:
                 logger.error(f"❌ Error leyendo {COVID_DATASET}: {e}")
-                return pd.DataFrame()
+                return pd.DataFrame(), DATOS_CACHE_TTL_FALLO
         else:
             logger.warning(f"⚠️ Archivo {COVID_DATASET.name} no encontrado. Usando simulación.")
-            return pd.DataFrame() 
+            return pd.DataFrame(), DATOS_CACHE_TTL_FALLO
+
+    @classmethod
+    def _leer_parquet_covid(cls) -> Optional[pd.DataFrame]:
+
+        # Copia Parquet de la columna de ubicación, válida mientras no sea más
+        # antigua que el CSV: un proceso nuevo no vuelve a parsear el CSV
+        parquet = COVID_DATASET.with_suffix('.parquet')
+        if not (PYARROW_ENABLED and parquet.exists()
+                and parquet.stat().st_mtime >= COVID_DATASET.stat().st_mtime):
+            return None
+        try:
+            return pd.read_parquet(parquet, engine='pyarrow')
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"No se pudo leer la caché Parquet de COVID: {e}")
+            return None
+
+    @classmethod
+    def _guardar_parquet_covid(cls, df: pd.DataFrame):
+
+        if not PYARROW_ENABLED or df.empty:
+            return
+        parquet = COVID_DATASET.with_suffix('.parquet')
+        temporal = parquet.with_name(f"{parquet.name}.{os.getpid()}.tmp")
+        try:
+            # Escritura en un temporal propio del proceso y os.replace: otro
+            # proceso nunca lee un Parquet a medio escribir ni comparte el
+            # temporal con otro worker que escriba a la vez
+            df.to_parquet(temporal, compression='snappy', engine='pyarrow', index=False)
+            os.replace(temporal, parquet)
+            logger.info(f"Caché Parquet de COVID guardada en: {parquet}")
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"No se pudo guardar la caché Parquet de COVID: {e}")
+
+    @classmethod
+    def _leer_columna_covid(cls, columna: str) -> pd.DataFrame:
+
+        # PyArrow parsea el CSV en paralelo con varios hilos
+        if PYARROW_ENABLED:
+            try:
+                return pd.read_csv(COVID_DATASET, usecols=[columna], engine='pyarrow')
+            except pa.ArrowInvalid as e:
+                logger.warning(f"Lectura con PyArrow falló ({e}). Se usa el motor C de pandas.")
+        
+        return pd.read_csv(COVID_DATASET, usecols=[columna])
 
     @classmethod
     def get_covid_intensity_by_department(cls, departamento: str, fecha: Optional[datetime] = None) -> float:
         # Lógica para obtener intensidad real o simulada si falla el CSV
         
-        df = cls.get_latest_data()
+        _, conteos = cls._get_entrada_cache()
         dept_norm = departamento.upper().strip()
 
-        if df.empty:
+        if conteos is None:
              return cls._get_simulated_intensity(dept_norm)
         
-        # 🚨 Lógica de Conteo de Casos (asumiendo que la columna de departamento es la primera)
+        # 🚨 Lógica de Conteo de Casos sobre los conteos por ubicación ya calculados
         try:
-             # Asumimos que la columna 'location' o similar es la segunda columna, como en el CSV
-             location_col = df.columns[1] if len(df.columns) > 1 else df.columns[0]
-             
-             # Filtrar datos (requiere una limpieza de nombres de departamento más sofisticada en un proyecto real)
-             dept_data = df[df[location_col].astype(str).str.upper().str.contains(dept_norm, na=False)]
+             # Ubicaciones que contienen el departamento (requiere una limpieza de
+             # nombres más sofisticada en un proyecto real)
+             total_casos = sum(
+                 n for ubicacion, n in conteos['por_ubicacion'].items() if dept_norm in ubicacion
+             )
              
-             if len(dept_data) == 0:
+             if total_casos == 0:
                  return cls._get_simulated_intensity(dept_norm)
              
-             total_casos = len(dept_data)
              # Normalizar con el mismo umbral de 100,000 usado en el simulado
              intensity = min(total_casos / 100000, 1.0)
              logger.info(f"📊 COVID en {departamento}: {total_casos:,} registros reales → intensidad {intensity:.2f}")
@@ -96,48 +281,28 @@ class MinisterioSaludAPI:
     @classmethod
     # Mantenemos esta función para caer en ella si el CSV falla.
     def _get_simulated_intensity(cls, departamento: str) -> float:
-        # ... (Mantener tu lógica de simulación de intensidad) ...
-        intensities = {
-            'LIMA': 0.85, 'CALLAO': 0.75, 'AREQUIPA': 0.45, 'LA LIBERTAD': 0.55, 'PIURA': 0.50,
-            'CUSCO': 0.40, 'LAMBAYEQUE': 0.60, 'JUNIN': 0.35, 'PUNO': 0.30, 'LORETO': 0.30, 
-            'ANCASH': 0.35, 'ICA': 0.40, 'UCAYALI': 0.38, 'SAN MARTIN': 0.32, 'CAJAMARCA': 0.28,
-            'HUANUCO': 0.25, 'AYACUCHO': 0.22, 'TACNA': 0.35, 'PASCO': 0.20, 'TUMBES': 0.30,
-            'APURIMAC': 0.18, 'MOQUEGUA': 0.25, 'HUANCAVELICA': 0.15, 'AMAZONAS': 0.18, 'MADRE DE DIOS': 0.20
-        }
-        return intensities.get(departamento, 0.3)
+        return _INTENSIDAD_SIMULADA.get(departamento, 0.3)
 
     @classmethod
     def get_all_departments_stats(cls) -> Dict[str, Dict]:
         """
         Calcula estadísticas reales agrupando el CSV local.
         """
-        df = cls.get_latest_data()
+        _, conteos = cls._get_entrada_cache()
         
-        if df.empty:
+        if conteos is None:
             return cls._get_simulated_all_stats()
             
-        # 🚨 Lógica de Agrupación de Casos (asumiendo que la columna de departamento es la segunda)
+        # 🚨 Casos por departamento estándar, agrupados una sola vez al leer el CSV
         try:
-            # Columna 'DEPT_CODE' o la columna de ubicación real de tu CSV
-            location_col = df.columns[1] if len(df.columns) > 1 else df.columns[0]
-            
-            # Mapeo de nombres cortos a nombres estandarizados (p. ej., "LIMASUR" -> "LIMA")
-            stats = df.groupby(location_col).size().to_dict()
-            result = {}
-            
-            for location_raw, count in stats.items():
-                location_upper = str(location_raw).upper().strip()
-                
-                # Intentamos mapear al departamento estándar (requiere lógica de limpieza)
-                dept = next((d for d in cls.DEPARTAMENTOS_MAP if d in location_upper or location_upper in d), None)
-                
-                if dept and dept not in result:
-                    intensity = min(count / 100000, 1.0)
-                    result[dept] = {
-                        'casos_totales': count,
-                        'intensidad': intensity,
-                        'impacto_riesgo': CLASIFICACION_RIESGO_BASE.get(dept, 'BAJO_RIESGO') 
-                    }
+            result = {
+                dept: {
+                    'casos_totales': count,
+                    'intensidad': min(count / 100000, 1.0),
+                    'impacto_riesgo': CLASIFICACION_RIESGO_BASE.get(dept, 'BAJO_RIESGO')
+                }
+                for dept, count in conteos['por_departamento'].items()
+            }
             
             # Asegurar que todos los departamentos tengan datos (simulados si faltan)
             simulated = cls._get_simulated_all_stats()
@@ -156,17 +321,8 @@ class MinisterioSaludAPI:
     @classmethod
     def _get_simulated_all_stats(cls) -> Dict[str, Dict]:
         """Estadísticas simuladas de COVID de fallback"""
-        simulated_cases = {
-            # ... (Tus casos simulados se mantienen) ...
-            'LIMA': 950000, 'CALLAO': 180000, 'AREQUIPA': 120000, 'LA LIBERTAD': 140000, 'PIURA': 110000,
-            'CUSCO': 95000, 'LAMBAYEQUE': 130000, 'JUNIN': 85000, 'PUNO': 70000, 'LORETO': 68000,
-            'ANCASH': 75000, 'ICA': 82000, 'UCAYALI': 72000, 'SAN MARTIN': 65000, 'CAJAMARCA': 60000,
-            'HUANUCO': 52000, 'AYACUCHO': 48000, 'TACNA': 55000, 'PASCO': 42000, 'TUMBES': 50000,
-            'APURIMAC': 38000, 'MOQUEGUA': 45000, 'HUANCAVELICA': 32000, 'AMAZONAS': 35000, 'MADRE DE DIOS': 40000
-        }
-        
         result = {}
-        for dept, cases in simulated_cases.items():
+        for dept, cases in _CASOS_SIMULADOS.items():
             result[dept] = {
                 'casos_totales': cases,
                 'intensidad': min(cases / 100000, 1.0),
@@ -195,8 +351,9 @@ class SenamhiAPI:
         Obtiene la anomalía basada en datos históricos locales (o simulación si falla).
         """
         try:
-            if TEMP_DATASET.exists():
-                df = pd.read_csv(TEMP_DATASET)
+            # El CSV se lee una vez por periodo de caché, no una vez por departamento
+            df = _obtener_cacheado('temperatura', cls._leer_datos_temperatura)
+            if df is not None:
                 # 🚨 Lógica de Extracción de Anomalía (asumiendo que la columna de anomalía es la última)
                 anomalia_col = df.columns[-1]
                 
@@ -207,44 +364,49 @@ class SenamhiAPI:
                 return round(last_anomalia, 2)
                 
             else:
-                logger.warning(f"⚠️ Archivo {TEMP_DATASET.name} no encontrado. Usando simulación.")
                 return cls._get_realistic_simulated_anomaly(departamento)
                 
         except Exception as e:
-            logger.error(f"❌ Error leyendo o procesando CSV de temperatura: {e}. Usando simulación.")
+            logger.error(f"❌ Error procesando CSV de temperatura: {e}. Usando simulación.")
             return cls._get_realistic_simulated_anomaly(departamento)
 
+    @classmethod
+    def _leer_datos_temperatura(cls) -> Tuple[Optional[pd.DataFrame], int]:
+        """
+        Lectura del CSV local de temperatura; None si no se pudo leer
+        """
+        if not TEMP_DATASET.exists():
+            logger.warning(f"⚠️ Archivo {TEMP_DATASET.name} no encontrado. Usando simulación.")
+            return None, DATOS_CACHE_TTL_FALLO
+        try:
+            return pd.read_csv(TEMP_DATASET), DATOS_CACHE_TTL
+        except Exception as e:
+            logger.error(f"❌ Error leyendo CSV de temperatura: {e}. Usando simulación.")
+            return None, DATOS_CACHE_TTL_FALLO
+
     @classmethod
     def _get_historical_average(cls, departamento: str) -> float:
-        # ... (Promedios se mantienen) ...
-        promedios = {
-            'LIMA': 19.0, 'AREQUIPA': 14.0, 'CUSCO': 11.5, 'PIURA': 24.0, 'LAMBAYEQUE': 22.0, 
-            'LA LIBERTAD': 19.5, 'JUNIN': 11.0, 'ICA': 20.0, 'PUNO': 8.5, 'LORETO': 26.0, 
-            'UCAYALI': 25.5, 'CALLAO': 20.0, 'ANCASH': 15.0, 'CAJAMARCA': 15.0, 'TACNA': 18.0
-        }
-        return promedios.get(departamento.upper(), 18.0)
+        return _TEMP_PROMEDIO.get(departamento.upper(), 18.0)
 
     @classmethod
     def _get_realistic_simulated_anomaly(cls, departamento: str) -> float:
-        # ... (Lógica de simulación se mantiene) ...
-        dept_upper = departamento.upper()
-        mes_actual = datetime.now().month
-        
-        base_anomalies = {
-             'LIMA': 0.5, 'CALLAO': 0.5, 'AREQUIPA': 0.8, 'CUSCO': -0.3, 'PIURA': 1.2, 
-             'LA LIBERTAD': 0.9, 'LAMBAYEQUE': 1.0, 'TUMBES': 1.3, 'LORETO': 1.1, 'UCAYALI': 1.0,
-             'SAN MARTIN': 0.9, 'MADRE DE DIOS': 1.1, 'JUNIN': -0.2, 'PASCO': -0.4, 'HUANUCO': 0.2,
-             'PUNO': -0.5, 'TACNA': 0.7, 'MOQUEGUA': 0.6, 'ICA': 0.8, 'ANCASH': 0.1, 
-             'CAJAMARCA': 0.0, 'AYACUCHO': -0.1, 'HUANCAVELICA': -0.3, 'APURIMAC': -0.2, 'AMAZONAS': 0.4
-         }
-        
-        base = base_anomalies.get(dept_upper, 0.3)
-        if mes_actual in [12, 1, 2, 3]: seasonal = 0.5
-        elif mes_actual in [6, 7, 8, 9]: seasonal = -0.4
+        # El día forma parte de la clave: a medianoche se calcula un valor nuevo
+        return cls._anomalia_simulada_del_dia(departamento.upper(), datetime.now().date())
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _anomalia_simulada_del_dia(dept_upper: str, dia: date) -> float:
+        """
+        Anomalía simulada, fija para un departamento y un día
+        """
+        base = _ANOMALIA_BASE.get(dept_upper, 0.3)
+        if dia.month in [12, 1, 2, 3]: seasonal = 0.5
+        elif dia.month in [6, 7, 8, 9]: seasonal = -0.4
         else: seasonal = 0.1
         
-        random.seed(dept_upper + str(datetime.now().date()))
-        variability = random.uniform(-0.3, 0.3)
+        # Generador propio sembrado con (departamento, día): mismo valor que
+        # antes, sin reiniciar el estado global de random que usan otros módulos
+        variability = random.Random(dept_upper + str(dia)).uniform(-0.3, 0.3)
 
         anomalia = base + seasonal + variability
         return round(max(-2.5, min(2.5, anomalia)), 2)
@@ -109,7 +109,9 @@ class AppState:
                     encoders_path=ENCODERS_FILE
                 )
                 self.fuzzy_system = FuzzyCreditRiskSystem()
-                self.feedback_module = FeedbackModule()
+                # Un único módulo dentro del servidor: cada feedback se escribe
+                # al recibirlo, sin depender de atexit al parar uvicorn
+                self.feedback_module = FeedbackModule(tam_buffer=1)
                 self.modelo_entrenado = True
                 logger.info("✅ Sistema inicializado correctamente")
             else: